@@ -0,0 +1,719 @@
+import os
+import io
+import re
+import sys
+import json
+import time
+import bisect
+import random
+import logging
+import tempfile
+import threading
+import tracemalloc
+import collections
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
+
+import god_ctl
+
+# Fleet benchmark of god_ctl: creates instances from one manifest, adds databases,
+# shows the status and stops and starts every instance, for fleets of 1 to 1000
+# instances. The apiserver, the pod exec stream, gs_ctl / gs_initdb and the
+# database are in-process fakes with injected latency and failures, so it runs
+# offline. Per phase it reports the latency of the commands, the apiserver
+# calls, exec round trips and SQL round trips they made and the peak memory
+# (tracemalloc, its overhead is part of the timings), and compares them with
+# the stored baseline.
+# Usage: python3 bench_fleet.py [-sizes 1,10,100,1000] [-members <n>] [-clients <n>]
+#        [-latency api=1,exec=2,tool=5,sql=1,pod=0] [-failrate <f>] [-seed <n>] [-qps <n>] [-runs <n>]
+#        [-session] [-daemon] [-fast] [-calls] [-baseline <file>] [-save] [-tolerance <f>]
+CURRENT_PATH = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.join(CURRENT_PATH, "bench_fleet_baseline.json")
+SIZES = [1, 10, 100, 1000]
+MEMBERS = 2  # 每个实例的成员数
+CLIENTS = 8  # 同时执行按实例命令的客户端数
+RUNS = 3  # 每个规模重复的次数, 取最好的一次
+# api: one apiserver request, exec: opening an exec stream, tool: a gs_ctl / gs_initdb / gs_probackup run,
+# sql: one database round trip, pod: from pod creation to Ready
+LATENCY_MS = {"api": 1, "exec": 2, "tool": 5, "sql": 1, "pod": 0}
+# the client side rate limit of god_ctl would be all there is to measure, -qps sets it
+QPS = 1000000
+TOLERANCE = 0.5  # 耗时和内存超过基线的比例, 调用次数另按精确值比较
+MIN_DELTA_MS = 50  # 小于该值的耗时增长不算退化
+MIN_DELTA_KB = 256  # 小于该值的内存增长不算退化
+BASE_PORT = 10000
+DBNAMES = "bench1,bench2"
+SHELL_FRAME = re.compile(r'^\(\n(.*)\n\) < /dev/null; echo "(\S+) \$\?"; echo \S+ >&2\n$', re.S)
+
+
+class ApiException(Exception):
+    def __init__(self, status=0, reason=None):
+        super().__init__("(%s) %s" % (status, reason))
+        self.status = status
+        self.reason = reason
+
+
+class DatabaseError(Exception):
+    pass
+
+
+def delay(ms):
+    if ms:
+        time.sleep(ms / 1000.0)
+
+
+def new_sts(name, replicas, annotations, ready_replicas):
+    return SimpleNamespace(metadata=SimpleNamespace(name=name, annotations=annotations, resource_version=None),
+                           spec=SimpleNamespace(replicas=replicas),
+                           status=SimpleNamespace(ready_replicas=ready_replicas or None))
+
+
+def new_pod(name, ready):
+    return SimpleNamespace(metadata=SimpleNamespace(name=name, resource_version=None),
+                           status=SimpleNamespace(phase="Running" if ready else "Pending",
+                                                  conditions=[SimpleNamespace(type="Ready",
+                                                                              status="True" if ready else "False")]))
+
+
+class FakeCluster:
+    """StatefulSets, pods and the members behind them, shared by all fake clients of one run.
+
+    Every change gets a resourceVersion and an event that the watches replay.
+    A member's data directory and catalog outlive its pod, the database does
+    not: a new pod waits for god_ctl's start signal like init.sh does.
+    """
+
+    def __init__(self, latency, failrate, seed):
+        self.latency = latency
+        self.failrate = failrate
+        self.random = random.Random(seed)
+        self.condition = threading.Condition()
+        self.closed = False
+        self.resource_version = 0
+        self.objects = {"statefulsets": {}, "pods": {}}
+        self.events = {"statefulsets": [], "pods": []}
+        self.versions = {"statefulsets": [], "pods": []}
+        self.members = {}
+        self.ports = {}
+        self.calls = collections.Counter()
+
+    def call(self, name, kind):
+        """Count one round trip and wait its latency, True if it is to fail."""
+        with self.condition:
+            self.calls[name] += 1
+            failed = self.random.random() < self.failrate
+        delay(self.latency[kind])
+        return failed
+
+    def take_calls(self):
+        with self.condition:
+            calls, self.calls = self.calls, collections.Counter()
+        return dict(calls)
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def put(self, kind, obj, event_type="MODIFIED"):
+        self.resource_version += 1
+        obj.metadata.resource_version = str(self.resource_version)
+        if event_type == "DELETED":
+            self.objects[kind].pop(obj.metadata.name, None)
+        else:
+            self.objects[kind][obj.metadata.name] = obj
+        self.events[kind].append((event_type, obj))
+        self.versions[kind].append(self.resource_version)
+        self.condition.notify_all()
+
+    def read(self, kind, name):
+        with self.condition:
+            obj = self.objects[kind].get(name)
+        if obj is None:
+            raise ApiException(status=404, reason="%s %s not found" % (kind, name))
+        return obj
+
+    def list(self, kind, limit=None, _continue=None, field_selector=None, **kwargs):
+        with self.condition:
+            items = sorted(self.objects[kind].values(), key=lambda item: item.metadata.name)
+            resource_version = str(self.resource_version)
+        if field_selector:
+            items = [item for item in items if item.metadata.name == field_selector.split("=", 1)[1]]
+        offset = int(_continue or 0)
+        end = offset + limit if limit else len(items)
+        return SimpleNamespace(items=items[offset:end],
+                               metadata=SimpleNamespace(_continue=str(end) if end < len(items) else None,
+                                                        resource_version=resource_version))
+
+    def watch(self, kind, resource_version=None, timeout_seconds=None, field_selector=None, **kwargs):
+        name = field_selector.split("=", 1)[1] if field_selector else None
+        deadline = time.time() + (timeout_seconds or god_ctl.CACHE_WATCH_TIMEOUT)
+        with self.condition:
+            position = bisect.bisect_right(self.versions[kind], int(resource_version or 0))
+        while True:
+            with self.condition:
+                while position == len(self.events[kind]):
+                    remaining = deadline - time.time()
+                    if self.closed or remaining <= 0:
+                        return
+                    self.condition.wait(remaining)
+                events = self.events[kind][position:]
+                position = len(self.events[kind])
+            for event_type, obj in events:
+                if name is None or obj.metadata.name == name:
+                    yield {"type": event_type, "object": obj}
+
+    def create_sts(self, body):
+        name = body["metadata"]["name"]
+        with self.condition:
+            if name in self.objects["statefulsets"]:
+                raise ApiException(status=409, reason="statefulsets %s already exists" % name)
+            self.put("statefulsets", new_sts(name, 0, dict(body["metadata"]["annotations"]), 0), "ADDED")
+            return self.scale(name, body["spec"]["replicas"])
+
+    def delete_sts(self, name):
+        with self.condition:
+            sts = self.read("statefulsets", name)
+            self.scale(name, 0)
+            self.put("statefulsets", sts, "DELETED")
+        return SimpleNamespace(status="Success")
+
+    def scale(self, name, replicas):
+        with self.condition:
+            sts = self.read("statefulsets", name)
+            for index in range(max(replicas, sts.spec.replicas)):
+                pod_name = "%s-%s" % (name, index)
+                pod = self.objects["pods"].get(pod_name)
+                if index >= replicas and pod is not None:
+                    self.members[pod_name].update(running=False, waiting=True)
+                    self.put("pods", pod, "DELETED")
+                elif index < replicas and pod is None:
+                    member = self.members.setdefault(pod_name, {
+                        "name": pod_name, "instance": name, "index": index, "initialized": False, "port": None,
+                        "role": None, "catalog": None})
+                    member.update(running=False, waiting=True, generation=member.get("generation", 0) + 1,
+                                  replicas=int(sts.metadata.annotations.get("replicas", replicas)))
+                    ready = not self.latency["pod"]
+                    self.put("pods", new_pod(pod_name, ready), "ADDED")
+                    if not ready:
+                        threading.Timer(self.latency["pod"] / 1000.0, self.pod_started, (pod_name,)).start()
+            sts = new_sts(name, replicas, sts.metadata.annotations, self.ready_replicas(name, replicas))
+            self.put("statefulsets", sts)
+            return sts
+
+    def ready_replicas(self, name, replicas):
+        pods = [self.objects["pods"].get("%s-%s" % (name, index)) for index in range(replicas)]
+        return len([pod for pod in pods if pod is not None and pod.status.phase == "Running"])
+
+    def pod_started(self, pod_name):
+        with self.condition:
+            if pod_name not in self.objects["pods"]:
+                return
+            self.put("pods", new_pod(pod_name, True))
+            name = self.members[pod_name]["instance"]
+            sts = self.objects["statefulsets"].get(name)
+            if sts is not None:
+                self.put("statefulsets", new_sts(name, sts.spec.replicas, sts.metadata.annotations,
+                                                 self.ready_replicas(name, sts.spec.replicas)))
+
+    def pod_generation(self, pod_name):
+        """Changes whenever the pod is recreated, None while there is none."""
+        with self.condition:
+            if pod_name not in self.objects["pods"]:
+                return None
+            return self.members[pod_name]["generation"]
+
+    def run(self, pod_name, command, session=False):
+        """Run one command in a pod, returns (output, exit code)."""
+        with self.condition:
+            self.calls["exec_command"] += 1
+            member = self.members.get(pod_name) if pod_name in self.objects["pods"] else None
+        if session and self.call("exec_session_rtt", "api"):
+            return "", god_ctl.FAILED
+        if member is None:
+            return "", god_ctl.FAILED
+        lines, returncode = self.fake_tool(member, command)
+        return "".join(line + "\n" for line in lines), returncode
+
+    def fake_tool(self, member, command):
+        """What gs_ctl, gs_initdb, gsql and the scripts of god_ctl answer for this member."""
+        if command.startswith("dir="):
+            return self.probe(member), 0
+        if ".ready-" in command:
+            if ".fifo" not in command:
+                return [], 0
+            action = re.search(r"echo (\w+) >", command).group(1)
+            with self.condition:
+                if not member["waiting"] or not member["initialized"]:
+                    return [], 0
+                self.start(member, "Standby" if action == "build" else None)
+            return ["signalled"], 0
+        if "golden=" in command or command.startswith(god_ctl.GS_INITDB_PATH):
+            delay(self.latency["tool"])
+            with self.condition:
+                member.update(initialized=True, catalog={"databases": {"postgres", "template0", "template1"},
+                                                         "tablespaces": set(), "users": set()})
+            return ["Success. %s initialized" % member["name"]], 0
+        if "listen_addresses" in command:
+            with self.condition:
+                member["port"] = re.search(r"port = (\d+)", command).group(1)
+                self.ports[member["port"]] = member
+            return [], 0
+        if "replconninfo" in command or command.startswith("rm -rf %s" % god_ctl.GOLDEN_PATH):
+            return [], 0
+        if god_ctl.GS_PROBACKUP_PATH in command:
+            delay(self.latency["tool"])
+            if " restore " in command:
+                with self.condition:
+                    member["initialized"] = True
+                return ["seed.bytes=%s" % (64 * 1024 * 1024)], 0
+            return ["INFO: Backup BENCH%s completed" % member["index"]], 0
+        for action in ("build", "start", "stop"):
+            if " %s -D" % action in command:
+                delay(self.latency["tool"])
+                with self.condition:
+                    return self.gs_ctl(member, action)
+        if "CHECKPOINT" in command or "SELECT 1" in command:
+            with self.condition:
+                if not member["running"]:
+                    return ["gsql: could not connect to server"], 1
+            return ["CHECKPOINT" if "CHECKPOINT" in command else "accepting"], 0
+        return [], 0
+
+    def gs_ctl(self, member, action):
+        if action == "stop":
+            if not member["running"]:
+                return ["gs_ctl: PID file does not exist", "Is server running?"], 1
+            # the supervisor exits with the postmaster, the restarted container waits for the signal
+            member.update(running=False, waiting=True)
+            return ["waiting for server to shut down.... done", "server stopped"], 0
+        if not member["initialized"]:
+            return ["gs_ctl: directory is not a database cluster directory"], 1
+        if action == "start" and member["running"]:
+            return ["gs_ctl: another server might be running"], 1
+        self.start(member, "Standby" if action == "build" else None)
+        return ["server started"], 0
+
+    def start(self, member, role=None):
+        if role is None:
+            role = "Normal" if member["replicas"] == 1 else "Primary" if member["index"] == 0 else "Standby"
+        member.update(running=True, waiting=False, role=role)
+
+    def probe(self, member):
+        with self.condition:
+            lines = ["probe.running=%s" % ("yes" if member["running"] else "no"),
+                     "probe.pid=%s" % (1000 + member["index"] if member["running"] else ""),
+                     "probe.port=%s" % (member["port"] or "")]
+            if member["running"]:
+                lines += ["probe.query:" + line for line in self.query(member)]
+        return lines
+
+    def query(self, member):
+        primary = self.members.get(member["instance"] + "-0")
+        streaming = member["role"] != "Standby" or primary["running"]
+        lines = ["HA state:",
+                 "    local_role                     : %s" % member["role"],
+                 "    db_state                       : %s" % ("Normal" if streaming else "Need repair"),
+                 "    detail_information             : %s" % ("Normal" if streaming else "Disconnected")]
+        links = []
+        if member["role"] == "Primary":
+            standbys = [self.members.get("%s-%s" % (member["instance"], index)) for index in
+                        range(1, member["replicas"])]
+            links = [("Senders info:", "sender_pid", standby) for standby in standbys if standby and standby["running"]]
+        elif member["role"] == "Standby" and streaming:
+            links = [("Receiver info:", "receiver_pid", member)]
+        for section, pid_key, peer in links:
+            if section not in lines:
+                lines.append(section)
+            lines += ["    %-30s : %s" % (pid_key, 2000 + peer["index"]),
+                      "    %-30s : Streaming" % "state",
+                      "    %-30s : 0/3000148" % "sender_sent_location",
+                      "    %-30s : 0/3000148" % "receiver_replay_location"]
+        return lines
+
+    def connect(self, port=None, **kwargs):
+        if self.call("sql_connect", "sql"):
+            raise DatabaseError("could not connect to server: injected failure")
+        with self.condition:
+            member = self.ports.get(str(port))
+            if member is None or not member["running"]:
+                raise DatabaseError("could not connect to server on port %s" % port)
+        return FakeConnection(self, member)
+
+    def execute(self, member, sql):
+        if self.call("sql", "sql"):
+            raise DatabaseError("server closed the connection unexpectedly")
+        rows = []
+        with self.condition:
+            catalog = member["catalog"]
+            for statement in sql.split(";\n"):
+                match = re.match(r"\s*SELECT datname FROM pg_database(?: WHERE datname = '(\w+)')?", statement)
+                if match:
+                    rows = [(name,) for name in sorted(catalog["databases"])
+                            if match.group(1) in (None, name)]
+                    continue
+                match = re.match(r"\s*CREATE (DATABASE|TABLESPACE|USER) (\w+)", statement)
+                if match:
+                    objects = catalog[match.group(1).lower() + "s"]
+                    if match.group(2) in objects:
+                        raise DatabaseError('%s "%s" already exists' % (match.group(1).lower(), match.group(2)))
+                    objects.add(match.group(2))
+        return rows
+
+
+class FakeConnection:
+    def __init__(self, cluster, member):
+        self.cluster = cluster
+        self.member = member
+        self.closed = 0
+
+    def set_isolation_level(self, level):
+        pass
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def close(self):
+        self.closed = 1
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def execute(self, sql):
+        self.rows = self.connection.cluster.execute(self.connection.member, sql)
+
+    def fetchall(self):
+        return self.rows
+
+
+class FakeExecStream:
+    """What kubernetes.stream returns for an exec, a one-shot command has all its output once it is open."""
+
+    def __init__(self, cluster, name, command):
+        self.cluster = cluster
+        self.name = name
+        self.buffers = {"stdout": "", "stderr": ""}
+        self.returncode = None
+        self.open = command == ["bash"]
+        # a shell dies with its pod
+        self.generation = cluster.pod_generation(name)
+        if not self.open:
+            prefix = "source /home/dbuser/.bashrc && "
+            output, self.returncode = cluster.run(name, command[-1][len(prefix):])
+            self.buffers["stdout"] = output
+
+    def is_open(self):
+        return self.open and self.cluster.pod_generation(self.name) == self.generation
+
+    def update(self, timeout=0):
+        pass
+
+    def peek_stdout(self):
+        return bool(self.buffers["stdout"])
+
+    def peek_stderr(self):
+        return bool(self.buffers["stderr"])
+
+    def read_stdout(self):
+        data, self.buffers["stdout"] = self.buffers["stdout"], ""
+        return data
+
+    def read_stderr(self):
+        data, self.buffers["stderr"] = self.buffers["stderr"], ""
+        return data
+
+    def write_stdin(self, data):
+        # a PodShell command, everything else written to the shell is setup
+        match = SHELL_FRAME.match(data)
+        if match is None:
+            return
+        output, returncode = self.cluster.run(self.name, match.group(1), session=True)
+        self.buffers["stdout"] += output + "%s %s\n" % (match.group(2), returncode)
+        self.buffers["stderr"] += match.group(2) + "\n"
+
+    def close(self):
+        self.open = False
+
+
+class FakeApiClient:
+    # god_ctl subclasses it, so requests pass its timeouts and rate limit on the way here
+    def __init__(self, configuration=None):
+        self.configuration = configuration
+
+    def request(self, method, url, *args, kind="api", **kwargs):
+        if self.configuration.cluster.call(method, kind):
+            raise ApiException(status=503, reason="injected failure of %s" % method)
+
+
+class FakeApi:
+    def __init__(self, api_client=None):
+        self.api_client = api_client
+        self.cluster = api_client.configuration.cluster
+
+    def request(self, method, watch=False, kind="api"):
+        self.api_client.request(method, None, query_params=[("watch", True)] if watch else [], kind=kind)
+
+
+class FakeCoreV1Api(FakeApi):
+    def read_namespaced_pod(self, name, namespace, **kwargs):
+        self.request("read_namespaced_pod")
+        return self.cluster.read("pods", name)
+
+    def list_namespaced_pod(self, namespace, watch=False, **kwargs):
+        self.request("watch_namespaced_pod" if watch else "list_namespaced_pod", watch)
+        return self.cluster.watch("pods", **kwargs) if watch else self.cluster.list("pods", **kwargs)
+
+    def connect_get_namespaced_pod_exec(self, name, namespace, command=None, **kwargs):
+        self.request("connect_get_namespaced_pod_exec", kind="exec")
+        self.cluster.read("pods", name)
+        return FakeExecStream(self.cluster, name, command)
+
+
+class FakeAppsV1Api(FakeApi):
+    def read_namespaced_stateful_set(self, name, namespace, **kwargs):
+        self.request("read_namespaced_stateful_set")
+        return self.cluster.read("statefulsets", name)
+
+    def list_namespaced_stateful_set(self, namespace, watch=False, **kwargs):
+        self.request("watch_namespaced_stateful_set" if watch else "list_namespaced_stateful_set", watch)
+        return self.cluster.watch("statefulsets", **kwargs) if watch else self.cluster.list("statefulsets", **kwargs)
+
+    def create_namespaced_stateful_set(self, namespace, body, **kwargs):
+        self.request("create_namespaced_stateful_set")
+        return self.cluster.create_sts(body)
+
+    def delete_namespaced_stateful_set(self, name, namespace, **kwargs):
+        self.request("delete_namespaced_stateful_set")
+        return self.cluster.delete_sts(name)
+
+    def patch_namespaced_stateful_set_scale(self, name, namespace, body, **kwargs):
+        self.request("patch_namespaced_stateful_set_scale")
+        self.cluster.read("statefulsets", name)
+        return self.cluster.scale(name, body["spec"]["replicas"])
+
+
+class FakeWatch:
+    def __init__(self):
+        self.stopped = False
+
+    def stream(self, func, *args, **kwargs):
+        for event in func(*args, watch=True, **kwargs):
+            yield event
+            if self.stopped:
+                return
+
+    def stop(self):
+        self.stopped = True
+
+
+def install(cluster, session, daemon):
+    """Point god_ctl's lazy modules at the fakes of cluster and drop what it kept of the previous run."""
+    god_ctl.client = SimpleNamespace(Configuration=lambda: SimpleNamespace(cluster=cluster),
+                                     ApiClient=FakeApiClient, CoreV1Api=FakeCoreV1Api, AppsV1Api=FakeAppsV1Api)
+    god_ctl.config = SimpleNamespace(load_kube_config=lambda *args, **kwargs: None)
+    god_ctl.kube_rest = SimpleNamespace(ApiException=ApiException)
+    god_ctl.kube_stream = SimpleNamespace(stream=lambda func, *args, **kwargs: func(*args, **kwargs))
+    god_ctl.watch = SimpleNamespace(Watch=FakeWatch)
+    god_ctl.psycopg2 = SimpleNamespace(connect=cluster.connect)
+    god_ctl.psycopg2_extensions = SimpleNamespace(ISOLATION_LEVEL_AUTOCOMMIT=0)
+    for cache in god_ctl._caches.values():
+        cache.stop()
+    god_ctl._caches.clear()
+    god_ctl.close_shells()
+    god_ctl.GaussHelper.close_all()
+    god_ctl._kube_configuration = None
+    god_ctl._kube_clients = None
+    god_ctl._rate_limiter = None
+    god_ctl._api_client_class = None
+    god_ctl._exec_local = threading.local()
+    god_ctl._shell_sessions = session or daemon
+    if daemon and god_ctl.start_cache(god_ctl.NAMESPACE) != god_ctl.SUCCESS:
+        raise RuntimeError("caches of the fake cluster are not synced")
+
+
+def write_manifest(path, names, members):
+    instances = []
+    for number, name in enumerate(names):
+        instances.append({"name": name, "members": [
+            {"id": "%s-%s" % (name, index), "host": "127.0.0.1", "port": str(BASE_PORT + (number * members + index) * 10)}
+            for index in range(members)]})
+    with open(path, "w") as manifest:
+        json.dump({"instances": instances}, manifest)
+
+
+def run_command(argv):
+    """Run one god_ctl command in this thread, returns (ok, ms)."""
+    god_ctl._request_local.output = io.StringIO()
+    start = time.perf_counter()
+    try:
+        ok = god_ctl.run_command(argv) == god_ctl.SUCCESS
+    except (Exception, SystemExit):
+        # helpers exit(1) on api errors they don't expect
+        ok = False
+    finally:
+        god_ctl._request_local.__dict__.clear()
+    return ok, (time.perf_counter() - start) * 1000
+
+
+def percentile(values, percent):
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+def run_phase(cluster, commands, clients):
+    cluster.take_calls()
+    tracemalloc.start()
+    start = time.perf_counter()
+    if clients <= 1 or len(commands) == 1:
+        results = [run_command(argv) for argv in commands]
+    else:
+        with ThreadPoolExecutor(max_workers=clients) as executor:
+            results = list(executor.map(run_command, commands))
+    wall_ms = (time.perf_counter() - start) * 1000
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    latencies = sorted(ms for _, ms in results)
+    return {
+        "wall_ms": round(wall_ms, 1),
+        "p50_ms": round(percentile(latencies, 50), 1),
+        "p95_ms": round(percentile(latencies, 95), 1),
+        "peak_kb": round(peak / 1024.0, 1),
+        "failed": len([ok for ok, _ in results if not ok]),
+        "calls": cluster.take_calls()
+    }
+
+
+def run_size(size, settings, workdir):
+    names = ["bench-%04d" % number for number in range(size)]
+    manifest = os.path.join(workdir, "manifest-%s.json" % size)
+    write_manifest(manifest, names, settings["members"])
+    stop_options = ["-fast"] if settings["fast"] else []
+    phases = [
+        ("create", [["create-db-instance", "-file", manifest]]),
+        ("add-database", [["add-database", "-instance", name, "-dbnames", DBNAMES] for name in names]),
+        ("status", [["status", "-json"]]),
+        ("stop", [["stop-db-instance", "-instance", name] + stop_options for name in names]),
+        ("start", [["start-db-instance", "-instance", name] for name in names])
+    ]
+    cluster = FakeCluster(settings["latency"], settings["failrate"], settings["seed"])
+    install(cluster, settings["session"], settings["daemon"])
+    results = {}
+    try:
+        for phase, commands in phases:
+            results["%s/%s" % (size, phase)] = run_phase(cluster, commands, settings["clients"])
+    finally:
+        cluster.close()
+    return results
+
+
+def print_result(key, result, show_calls):
+    calls = result["calls"]
+    streams = calls.get("connect_get_namespaced_pod_exec", 0)
+    sql = calls.get("sql", 0) + calls.get("sql_connect", 0)
+    api = sum(calls.values()) - streams - sql - calls.get("exec_command", 0) - calls.get("exec_session_rtt", 0)
+    size, phase = key.split("/")
+    print("%6s %-13s %10.1f %9.1f %9.1f %8s %8s %8s %8s %10.1f %7s" % (
+        size, phase, result["wall_ms"], result["p50_ms"], result["p95_ms"], api, streams,
+        calls.get("exec_command", 0), sql, result["peak_kb"], result["failed"]))
+    if show_calls:
+        for name in sorted(calls):
+            print("%6s   %-40s %8s" % ("", name, calls[name]))
+
+
+def compare(results, baseline, tolerance):
+    """Regressions of results against baseline: more calls or failures, or slower / bigger beyond tolerance."""
+    failed = []
+    for key, result in results.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        for metric, slack in (("wall_ms", MIN_DELTA_MS), ("p95_ms", MIN_DELTA_MS), ("peak_kb", MIN_DELTA_KB)):
+            if result[metric] > base[metric] * (1 + tolerance) and result[metric] - base[metric] > slack:
+                failed.append("%s %s %.1f, baseline %.1f" % (key, metric, result[metric], base[metric]))
+        for name, count in sorted(result["calls"].items()):
+            if count > base["calls"].get(name, 0):
+                failed.append("%s makes %s %s calls, baseline %s" % (key, count, name, base["calls"].get(name, 0)))
+        if result["failed"] > base["failed"]:
+            failed.append("%s has %s failed commands, baseline %s" % (key, result["failed"], base["failed"]))
+    return failed
+
+
+def parse_latency(value):
+    latency = dict(LATENCY_MS)
+    for item in filter(None, value.split(",")):
+        name, _, ms = item.partition("=")
+        if name not in latency:
+            raise ValueError("unknown latency %s, one of %s" % (name, ",".join(latency)))
+        latency[name] = float(ms)
+    return latency
+
+
+def main():
+    args = sys.argv[1:]
+
+    def option(name, default):
+        return args[args.index(name) + 1] if name in args else default
+
+    settings = {
+        "members": int(option("-members", MEMBERS)),
+        "clients": int(option("-clients", CLIENTS)),
+        "latency": parse_latency(option("-latency", "")),
+        "failrate": float(option("-failrate", 0)),
+        "seed": int(option("-seed", 0)),
+        "session": "-session" in args,
+        "daemon": "-daemon" in args,
+        "fast": "-fast" in args
+    }
+    sizes = [int(size) for size in option("-sizes", ",".join(str(size) for size in SIZES)).split(",")]
+    runs = int(option("-runs", RUNS))
+    baseline_path = option("-baseline", BASELINE_PATH)
+    tolerance = float(option("-tolerance", TOLERANCE))
+    os.environ["GOD_CTL_KUBE_QPS"] = option("-qps", str(QPS))
+    os.environ["GOD_CTL_KUBE_BURST"] = os.environ["GOD_CTL_KUBE_QPS"]
+    logging.disable(logging.CRITICAL)
+
+    results = {}
+    print("%6s %-13s %10s %9s %9s %8s %8s %8s %8s %10s %7s" % ("size", "phase", "wall_ms", "p50_ms", "p95_ms",
+                                                              "api", "streams", "execs", "sql", "peak_kb",
+                                                              "failed"))
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in sizes:
+            runs_results = [run_size(size, settings, workdir) for _ in range(runs)]
+            for key in runs_results[0]:
+                # the best run is the least disturbed by the rest of the machine
+                results[key] = min((item[key] for item in runs_results), key=lambda result: result["wall_ms"])
+                print_result(key, results[key], "-calls" in args)
+
+    failed = []
+    if "-save" in args:
+        with open(baseline_path, "w") as baseline_file:
+            json.dump({"settings": settings, "results": results}, baseline_file, indent=1, sort_keys=True)
+        print("baseline saved to %s" % baseline_path)
+    elif os.path.isfile(baseline_path):
+        with open(baseline_path) as baseline_file:
+            baseline = json.load(baseline_file)
+        current = json.loads(json.dumps(settings))
+        changed = sorted(name for name in set(current) | set(baseline["settings"])
+                         if current.get(name) != baseline["settings"].get(name))
+        if changed:
+            # other settings make other calls at other speeds, nothing to compare with
+            print("baseline %s was taken with other %s, not compared" % (baseline_path, ",".join(changed)))
+        else:
+            failed = compare(results, baseline["results"], tolerance)
+    else:
+        print("no baseline at %s, run with -save to store one" % baseline_path)
+    for item in failed:
+        print("[FAILED]" + item)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,127 @@
+import os
+import sys
+import json
+import time
+import subprocess
+
+# Startup budget of god_ctl: time from interpreter start until a command with
+# valid arguments has checked them and is about to talk to the cluster, and
+# the modules it imported to get there. With -kubeconfig the kube config load
+# of the commands is timed as well.
+# Usage: python3 bench_startup.py [-runs <n>] [-kubeconfig]
+CURRENT_PATH = os.path.dirname(os.path.abspath(__file__))
+BUDGET_MS = {
+    "usage": 150,
+    "default": 250,
+    "kube-init": 500
+}
+# none of these may be imported before a command really needs them
+HEAVY_MODULES = ["kubernetes", "psycopg2", "yaml", "urllib3"]
+COMMANDS = [
+    [],
+    ["create-db-instance", "-file", os.path.join(CURRENT_PATH, "manifest.json"), "-concurrency", "2"],
+    ["delete-db-instance", "-instance", "a"],
+    ["add-database", "-instance", "a", "-dbnames", "db01,db02"],
+    ["remove-database", "-instance", "a", "-dbnames", "db01"],
+    ["start-db-instance", "-instance", "a", "-parallel", "2"],
+    ["stop-db-instance", "-instance", "a", "-fast"],
+    ["status", "-json"],
+    ["serve", "-socket", "/tmp/bench_startup.sock"]
+]
+
+CHILD_SCRIPT = '''
+import sys
+import json
+import time
+import logging
+start = time.perf_counter()
+sys.path.insert(0, %r)
+import god_ctl
+imported = time.perf_counter()
+logging.disable(logging.CRITICAL)
+god_ctl.print_screen = lambda *args, **kwargs: None
+
+
+class KubeBoundary(BaseException):
+    pass
+
+
+boundary = {}
+
+
+def kube_boundary():
+    # the command got as far as the cluster, that is where the startup ends. The
+    # except clauses the abort runs through import kubernetes, so look before
+    boundary["time"] = time.perf_counter()
+    boundary["modules"] = set(sys.modules)
+    raise KubeBoundary()
+
+
+get_kube_clients = god_ctl.get_kube_clients
+god_ctl.get_kube_clients = kube_boundary
+try:
+    god_ctl.run_command(%r)
+except BaseException:
+    if not boundary:
+        raise
+dispatched = boundary.get("time", time.perf_counter())
+modules = boundary.get("modules", sys.modules)
+heavy = sorted({name.split(".")[0] for name in modules} & set(%r))
+init = None
+if %r:
+    get_kube_clients()
+    init = (time.perf_counter() - dispatched) * 1000
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "dispatch_ms": (dispatched - imported) * 1000,
+    "init_ms": init,
+    "heavy": heavy,
+    "reached": bool(boundary)
+}))
+'''
+
+
+def run_once(argv, kube_init):
+    script = CHILD_SCRIPT % (CURRENT_PATH, argv, HEAVY_MODULES, kube_init)
+    env = dict(os.environ, GOD_CTL_SOCKET="off")
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, "-c", script], env=env, check=True,
+                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL).stdout
+    result = json.loads(output.decode("utf-8").strip().splitlines()[-1])
+    result["total_ms"] = (time.perf_counter() - start) * 1000
+    return result
+
+
+def main():
+    args = sys.argv[1:]
+    runs = int(args[args.index("-runs") + 1]) if "-runs" in args else 5
+    kube_init = "-kubeconfig" in args
+    failed = []
+    print("%-20s %10s %10s %10s %10s %8s  %s" % ("command", "total_ms", "import_ms", "dispatch_ms", "init_ms",
+                                                 "budget", "heavy modules"))
+    for argv in COMMANDS:
+        name = argv[0] if argv else "usage"
+        results = [run_once(argv, kube_init and bool(argv)) for _ in range(runs)]
+        # the best run is the least disturbed by the rest of the machine
+        best = min(results, key=lambda item: item["total_ms"] - (item["init_ms"] or 0))
+        budget = BUDGET_MS.get(name, BUDGET_MS["default"])
+        init_ms = best["init_ms"]
+        startup_ms = best["total_ms"] - (init_ms or 0)
+        print("%-20s %10.1f %10.1f %10.1f %10s %8s  %s" % (
+            name, best["total_ms"], best["import_ms"], best["dispatch_ms"],
+            "-" if init_ms is None else "%.1f" % init_ms, budget, ",".join(best["heavy"]) or "-"))
+        if startup_ms > budget:
+            failed.append("%s takes %.1fms, budget %sms" % (name, startup_ms, budget))
+        if argv and not best["reached"]:
+            failed.append("%s stops before the cluster, check its arguments" % name)
+        if best["heavy"]:
+            failed.append("%s imports %s before it needs them" % (name, best["heavy"]))
+        if init_ms is not None and init_ms > BUDGET_MS["kube-init"]:
+            failed.append("%s kube init takes %.1fms, budget %sms" % (name, init_ms, BUDGET_MS["kube-init"]))
+    for item in failed:
+        print("[FAILED]" + item)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
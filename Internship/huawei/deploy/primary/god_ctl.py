@@ -1,18 +1,47 @@
 import sys
 import os
+import pwd
 import time
+import importlib
 import re
 import logging
 import subprocess
 import json
-from psycopg2 import connect
-from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
-
-import yaml
-from kubernetes import client
-from kubernetes import config
-from kubernetes.client.rest import ApiException
-from kubernetes.stream import stream
+import io
+import socket
+import socketserver
+import struct
+import threading
+import atexit
+import collections
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+
+class LazyModule:
+    """Import a module on first attribute access.
+
+    kubernetes and psycopg2 take most of the startup time, commands that
+    don't talk to the cluster or the database never import them.
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+psycopg2 = LazyModule("psycopg2")
+psycopg2_extensions = LazyModule("psycopg2.extensions")
+client = LazyModule("kubernetes.client")
+config = LazyModule("kubernetes.config")
+kube_rest = LazyModule("kubernetes.client.rest")
+kube_stream = LazyModule("kubernetes.stream")
+watch = LazyModule("kubernetes.watch")
 
 COMMAND_INDEX = 1
 ARG_START_INDEX = 2
@@ -24,14 +53,52 @@ FAILED = 1
 
 SINGLE = 0
 PRIMARY = 1
+MAX_PARALLEL = 8  # 并发操作成员的默认线程数
+STATUS_PARALLEL = 32  # status 命令并发探测成员的默认线程数
+MANIFEST_CONCURRENCY = 4  # 按清单创建时同时初始化的实例数
+DB_READY_TIMEOUT = 120  # 等待数据库接受连接的超时时间(秒)
+STANDBY_CATCHUP_TIMEOUT = 30  # 备机启动后等待其与主机建立复制的时间(秒)
+# StatefulSet的podManagementPolicy, 模板不指定时多成员实例用Parallel, 启停顺序由god_ctl保证
+POD_MANAGEMENT_POLICIES = ["OrderedReady", "Parallel"]
+# 新备机的数据来源, 模板的seed字段: build为gs_ctl build -b full, probackup为主机的gs_probackup备份
+SEED_METHODS = ["build", "probackup"]
+PROBACKUP_JOBS = 4  # gs_probackup备份/恢复的并行度
+HANDSHAKE_TIMEOUT = 60  # 通知pod启动数据库后等待其运行的时间(秒), 超时后改为exec启动
+STS_READY_TIMEOUT = 300  # 等待sts就绪的超时时间(秒)
+PAGE_LIMIT = 500  # list接口分页大小
+RETRY_STATUS = (429, 500, 502, 503, 504)  # 可重试的apiserver错误码
+CACHE_WATCH_TIMEOUT = 300  # 缓存watch单次连接的时长(秒)
+CACHE_MAX_STALENESS = 60  # watch断开后缓存仍可使用的时长(秒)
+GAUSS_POOL_SIZE = 8  # 每个数据库实例的连接池大小
+GAUSS_POOL_TIMEOUT = 60  # 等待空闲连接的超时时间(秒)
+GAUSS_HEALTH_CHECK_IDLE = 30  # 连接空闲超过该时长(秒)后复用前先检查
+# openGauss不允许在事务块中执行的语句, 不能和其它语句合并发送
+NON_TRANSACTIONAL_SQL = re.compile(r"^\s*((CREATE|DROP)\s+(TABLESPACE|DATABASE)|VACUUM|ALTER\s+SYSTEM)\b", re.I)
 
 NAMESPACE = 'manager'
 GAUSS_ROOT = "/opt/data1/greenopengauss"
 GAUSS_HOME = GAUSS_ROOT + "/app"
 GS_CTl_PATH = GAUSS_HOME + "/bin/gs_ctl"
 GS_INITDB_PATH = GAUSS_HOME + "/bin/gs_initdb"
+GS_PROBACKUP_PATH = GAUSS_HOME + "/bin/gs_probackup"
+GSQL_PATH = GAUSS_HOME + "/bin/gsql"
 GS_DATA_PATH = GAUSS_ROOT + "/data"
+BACKUP_PATH = GS_DATA_PATH + "/.backup"  # 用gs_probackup填充备机时的备份目录
+STARTING_FILE = GAUSS_ROOT + "/run/starting"  # init.sh建立/启动成员期间存在, 内容为其动作
+GOLDEN_PATH = GS_DATA_PATH + "/.golden"  # 各镜像版本/locale下gs_initdb结果的缓存, 新成员从这里复制
 KUBE_CONFIG_PATH = "config"
+DAEMON_SOCKET = "/tmp/god_ctl-%s.sock" % os.geteuid()  # god_ctl serve的默认监听地址(每个用户一个), 可用GOD_CTL_SOCKET覆盖
+FILE_OPTIONS = ["file", "dbfile"]  # 取值为文件路径的选项, 转发给daemon前改为绝对路径
+# kubernetes客户端参数, 均可用同名的GOD_CTL_环境变量覆盖, 如GOD_CTL_KUBE_QPS
+KUBE_POOL_SIZE = 32  # 到apiserver的连接池大小
+KUBE_CONNECT_TIMEOUT = 5  # 连接超时(秒)
+KUBE_READ_TIMEOUT = 60  # 读超时(秒), watch请求不受限
+KUBE_KEEPALIVE = 30  # TCP keepalive空闲探测时间(秒)
+KUBE_QPS = 50  # 客户端限流, 每秒请求数
+KUBE_BURST = 100  # 客户端限流, 突发请求数
+SHELL_COMMAND_TIMEOUT = 1800  # 会话模式下单条远程命令的超时时间(秒)
+SHELL_POOL_SIZE = 4  # 会话模式下每个pod最多同时打开的shell数, 都忙时改用一次性exec
+OUTPUT_MAX_LINES = 1000  # 命令输出最多保留的行数
 
 LOG_FORMAT = "%(asctime)s - %(levelname)s - [%(module)s - %(lineno)d : %(funcName)s] - %(message)s"
 DATE_FORMAT = "%m/%d/%Y %H:%M:%S %p"
@@ -43,20 +110,43 @@ logging.basicConfig(filename=None,
 logger = logging.getLogger(__name__)
 usage_info = '''
 Usage:
-python3 opengauss_ctl.py create-db-instance -file <filename>
+python3 opengauss_ctl.py create-db-instance -file <filename> [-parallel <n>]
+python3 opengauss_ctl.py create-db-instance -file <manifest> [-parallel <n>] [-concurrency <n>]
 python3 opengauss_ctl.py delete-db-instance -instance <instance>
-python3 opengauss_ctl.py add-database -instance <instance> -dbnames <db name list>
-python3 opengauss_ctl.py remove-database -instance <instance> -dbnames <db name list>
-python3 opengauss_ctl.py start-db-instance -instance <instance>
-python3 opengauss_ctl.py stop-db-instance -instance <instance>
+python3 opengauss_ctl.py add-database -instance <instance> -dbnames <db name list> [-poolsize <n>]
+python3 opengauss_ctl.py add-database -instance <instance> -dbfile <db name file> [-parallel <n>]
+python3 opengauss_ctl.py remove-database -instance <instance> -dbnames <db name list> [-poolsize <n>]
+python3 opengauss_ctl.py remove-database -instance <instance> -dbfile <db name file> [-parallel <n>]
+python3 opengauss_ctl.py start-db-instance -instance <instance> [-parallel <n>]
+python3 opengauss_ctl.py stop-db-instance -instance <instance> [-fast] [-parallel <n>]
+python3 opengauss_ctl.py status [-instance <instance>] [-json] [-parallel <n>]
+python3 opengauss_ctl.py serve [-socket <path>]
+Options:
+-concurrency  instances of a manifest ({"instances": [<template>, ...]}) initialized at the same time
+-no-golden       run gs_initdb for every member instead of cloning the cached golden data directory
+-refresh-golden  drop the golden data directories first, they are rebuilt by the first member that needs one
+-fast     stop the standbys in parallel, checkpoint the primary and stop it with -m fast, then scale to 0 at once
+-bulk     add/remove every database of the list in parallel and report each one, don't stop at the first error
+-cache    serve pod/sts lookups from a watched in-memory cache (or set GOD_CTL_CACHE=1)
+-session  run remote commands over a few long-lived shells per pod (or set GOD_CTL_SESSION=1)
 Example:
 python3 opengauss_ctl.py create-db-instance -file zenith_template.json
+python3 opengauss_ctl.py create-db-instance -file zenith_template.json -parallel 1
+python3 opengauss_ctl.py create-db-instance -file zenith_template.json -refresh-golden
+python3 opengauss_ctl.py create-db-instance -file manifest.json -concurrency 8
 python3 opengauss_ctl.py delete-db-instance -instance xiangyu
 python3 opengauss_ctl.py add-database -instance xiangyu -dbnames dbname01,dbname02
 python3 opengauss_ctl.py remove-database -instance xiangyu -dbnames dbname01,dbname02
 python3 opengauss_ctl.py start-db-instance -instance xiangyu
 python3 opengauss_ctl.py stop-db-instance -instance xiangyu
-'''
+python3 opengauss_ctl.py stop-db-instance -instance xiangyu -fast
+python3 opengauss_ctl.py status
+python3 opengauss_ctl.py status -instance xiangyu -json
+python3 opengauss_ctl.py serve -socket /tmp/god_ctl.sock
+While "serve" runs, the other commands are forwarded to it over its unix socket
+(GOD_CTL_SOCKET, default %s), set GOD_CTL_SOCKET=off to always run locally.
+Only a daemon of the same user is used, otherwise the command runs locally.
+''' % DAEMON_SOCKET
 
 
 # # no use
@@ -69,11 +159,96 @@ python3 opengauss_ctl.py stop-db-instance -instance xiangyu
 #         self.instance_dir = None
 
 
+def get_kube_setting(name):
+    return type(globals()[name])(os.environ.get("GOD_CTL_" + name, globals()[name]))
+
+
+class RateLimiter:
+    """Token bucket shared by all kube clients of the process: qps requests per second, bursts up to burst."""
+
+    def __init__(self, qps, burst):
+        self.qps = qps
+        self.burst = burst
+        self.tokens = burst
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.last) * self.qps)
+            self.last = now
+            # take the token now, a negative balance is the wait of this caller
+            self.tokens -= 1
+            wait = -self.tokens / self.qps if self.tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+
+_kube_configuration = None
+_kube_clients = None
+_kube_clients_lock = threading.Lock()
+_rate_limiter = None
+_api_client_class = None
+
+
+def get_kube_configuration():
+    """Load the kube config once per process and apply the KUBE_* tuning to it."""
+    global _kube_configuration, _rate_limiter
+    with _kube_clients_lock:
+        if _kube_configuration is None:
+            configuration = client.Configuration()
+            config.load_kube_config(KUBE_CONFIG_PATH, client_configuration=configuration)
+            configuration.connection_pool_maxsize = get_kube_setting("KUBE_POOL_SIZE")
+            if hasattr(configuration, "socket_options"):
+                # keep idle connections to the apiserver alive instead of reconnecting
+                keepalive = get_kube_setting("KUBE_KEEPALIVE")
+                configuration.socket_options = [
+                    (socket.IPPROTO_TCP, socket.TCP_NODELAY, 1),
+                    (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
+                    (socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, keepalive),
+                    (socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, max(1, keepalive // 3)),
+                    (socket.IPPROTO_TCP, socket.TCP_KEEPCNT, 3)
+                ]
+            _rate_limiter = RateLimiter(get_kube_setting("KUBE_QPS"), get_kube_setting("KUBE_BURST"))
+            _kube_configuration = configuration
+        return _kube_configuration
+
+
+def new_api_client():
+    """ApiClient on the shared configuration, with the default timeouts and the shared rate limit.
+
+    Everything uses the client of get_kube_clients(), a new one is only
+    needed where kubernetes.stream patches the client while it execs.
+    """
+    global _api_client_class
+    configuration = get_kube_configuration()
+    if _api_client_class is None:
+        class TunedApiClient(client.ApiClient):
+            def request(self, method, url, *args, **kwargs):
+                query_params = kwargs.get("query_params") or []
+                if kwargs.get("_request_timeout") is None and ("watch", True) not in query_params:
+                    kwargs["_request_timeout"] = (get_kube_setting("KUBE_CONNECT_TIMEOUT"),
+                                                  get_kube_setting("KUBE_READ_TIMEOUT"))
+                _rate_limiter.acquire()
+                return super().request(method, url, *args, **kwargs)
+        _api_client_class = TunedApiClient
+    return _api_client_class(configuration)
+
+
+def get_kube_clients():
+    """The process-wide CoreV1Api and AppsV1Api, both on one tuned ApiClient."""
+    global _kube_clients
+    if _kube_clients is None:
+        api_client = new_api_client()
+        with _kube_clients_lock:
+            if _kube_clients is None:
+                _kube_clients = (client.CoreV1Api(api_client), client.AppsV1Api(api_client))
+    return _kube_clients
+
+
 class Instance:
     def __init__(self):
-        config.load_kube_config(KUBE_CONFIG_PATH)
-        self.core_v1 = client.CoreV1Api()
-        self.app_v1 = client.AppsV1Api()
         self.gauss_root = GAUSS_ROOT
         self.gauss_home = GAUSS_HOME
         self.gs_ctl_path = GS_CTl_PATH
@@ -83,6 +258,15 @@ class Instance:
         self.name = None
         self.mode = None
 
+    # the kube config is loaded on first use, argument errors never pay for it
+    @property
+    def core_v1(self):
+        return get_kube_clients()[0]
+
+    @property
+    def app_v1(self):
+        return get_kube_clients()[1]
+
 
 class CreateDBInstance(Instance):
     def __init__(self):
@@ -93,6 +277,13 @@ class CreateDBInstance(Instance):
         self.mandatory = ["file"]
         self.template = ["id", "host", "port"]
         self.optional = ["class"]
+        self.parallel = MAX_PARALLEL
+        self.instances = None
+        self.concurrency = MANIFEST_CONCURRENCY
+        self.pod_management_policy = None
+        self.golden = True
+        self.golden_refresh = None
+        self.seed = "build"
 
     def check_template(self, file_dict):
         for item in ["name", "members"]:
@@ -106,6 +297,17 @@ class CreateDBInstance(Instance):
             logger.error("members can't be empty")
             return FAILED
 
+        self.seed = file_dict.get("seed", "build")
+        if self.seed not in SEED_METHODS:
+            logger.error("[ERROR]seed(%s) must be one of %s" % (self.seed, SEED_METHODS))
+            return FAILED
+
+        self.pod_management_policy = file_dict.get("podManagementPolicy")
+        if self.pod_management_policy is not None and self.pod_management_policy not in POD_MANAGEMENT_POLICIES:
+            logger.error("[ERROR]podManagementPolicy(%s) must be one of %s" % (
+                self.pod_management_policy, POD_MANAGEMENT_POLICIES))
+            return FAILED
+
         for member in members:
             for item in self.template:
                 if item not in member:
@@ -127,6 +329,16 @@ class CreateDBInstance(Instance):
         if not file_dict:
             return FAILED
 
+        self.parallel = get_parallel(args_map)
+        if self.parallel is None:
+            return FAILED
+        self.golden = "nogolden" not in args_map
+        if "refreshgolden" in args_map:
+            self.golden_refresh = GoldenRefresh()
+
+        if "instances" in file_dict:
+            return self.check_manifest(file_dict, args_map)
+
         if self.check_template(file_dict) != SUCCESS:
             return FAILED
 
@@ -137,9 +349,37 @@ class CreateDBInstance(Instance):
 
         return SUCCESS
 
+    def check_manifest(self, file_dict, args_map):
+        templates = file_dict.get("instances")
+        if not templates:
+            logger.error("instances can't be empty")
+            return FAILED
+        self.instances = []
+        for template in templates:
+            instance = CreateDBInstance()
+            if instance.check_template(template) != SUCCESS:
+                return FAILED
+            instance.parallel = self.parallel
+            instance.golden = self.golden
+            # shared, so that the golden data directories are dropped once for all instances
+            instance.golden_refresh = self.golden_refresh
+            instance.mode = SINGLE if len(instance.members) == 1 else PRIMARY
+            self.instances.append(instance)
+        names = [instance.name for instance in self.instances]
+        duplicates = sorted({name for name in names if names.count(name) > 1})
+        if duplicates:
+            logger.error("[ERROR]instances (%s) appear more than once" % ", ".join(duplicates))
+            return FAILED
+        self.concurrency = get_positive_int(args_map, "concurrency", MANIFEST_CONCURRENCY)
+        if self.concurrency is None:
+            return FAILED
+        return SUCCESS
+
     def exec(self, args_map):
         if self.check_param(args_map) != SUCCESS:
             return FAILED
+        if self.instances is not None:
+            return self.create_db_instances()
         if self.create_db_instance() != SUCCESS:
             self.clear_instance()
             return FAILED
@@ -164,23 +404,20 @@ class CreateDBInstance(Instance):
             return FAILED
 
         logger.info("[INFO]Launching sts (%s)" % instance)
-        _, ret = create_sts(self.app_v1, instance, len(self.members))
-        if not ret:
-            logger.info("[INFO]Launching sts (%s) success" % instance)
-        else:
+        _, ret = create_sts(self.app_v1, instance, len(self.members), self.pod_management_policy, self.seed)
+        if ret:
             logger.error("[INFO]Launching sts (%s) failed" % instance)
+            return FAILED
+        logger.info("[INFO]Launching sts (%s) success" % instance)
 
-        time_out = 1
-        while time_out != 10 and not is_sts_ready(self.app_v1, instance, NAMESPACE):
-            logger.info("Waiting sts %s ready" % instance)
-            time.sleep(time_out)
-            time_out += 1
-
-        if time_out >= 10:
+        if not wait_sts_ready(self.app_v1, instance, NAMESPACE):
             logger.error("[INFO]Launching sts (%s) failed" % instance)
             return FAILED
         logger.info("Sts %s RUNNING" % instance)
+        return self.setup_instance()
 
+    def setup_instance(self):
+        instance = self.name
         logger.info("Start initialize instance %s" % instance)
         if SUCCESS != self.init_instance():
             logger.error("[INFO]Init instance (%s) failed" % instance)
@@ -192,19 +429,84 @@ class CreateDBInstance(Instance):
                 return FAILED
         return SUCCESS
 
+    def create_db_instances(self):
+        """Create every StatefulSet of the manifest up front, then set up each instance as soon as it is ready.
+
+        A single watch on the namespace reports the ready StatefulSets, at most
+        `concurrency` instances are initialized at the same time.
+        """
+        start = time.time()
+        instances = {instance.name: instance for instance in self.instances}
+        summary = {}
+        for name, instance in instances.items():
+            logger.info("[INFO]Launching sts (%s)" % name)
+            _, ret = create_sts(self.app_v1, name, len(instance.members), instance.pod_management_policy,
+                                instance.seed)
+            if ret:
+                summary[name] = (FAILED, "create sts failed", time.time() - start)
+
+        def setup(name):
+            ret = instances[name].setup_instance()
+            summary[name] = (ret, "ready" if ret == SUCCESS else "setup failed", time.time() - start)
+            return ret
+
+        launched = [name for name in instances if name not in summary]
+        try:
+            with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                futures = {}
+                for name in iter_ready(self.app_v1.list_namespaced_stateful_set, launched, NAMESPACE, sts_ready,
+                                       STS_READY_TIMEOUT, "statefulsets"):
+                    logger.info("Sts %s RUNNING" % name)
+                    futures[name] = executor.submit(bind_request(setup), name)
+                for name in launched:
+                    if name not in futures:
+                        logger.error("[ERROR]StatefulSet %s is not ready in %ss" % (name, STS_READY_TIMEOUT))
+                        summary[name] = (FAILED, "sts not ready", time.time() - start)
+                for name, future in futures.items():
+                    try:
+                        future.result()
+                    except (Exception, SystemExit) as e:
+                        # the helpers exit(1) on api errors they don't know, that ends one instance, not the fleet
+                        logger.exception("[ERROR]setup of instance(%s) raised an exception: %s" % (name, e))
+                        summary[name] = (FAILED, "setup failed", time.time() - start)
+        finally:
+            for name in instances:
+                ret, state, elapsed = summary.get(name, (FAILED, "aborted", time.time() - start))
+                print_screen("%-20s %-8s %-18s %8.1fs" % (name, "SUCCESS" if ret == SUCCESS else "FAILED", state,
+                                                          elapsed))
+            failed = [name for name in instances if summary.get(name, (FAILED,))[0] != SUCCESS]
+            print_screen("%s instances, %s failed, total %.1fs" % (len(instances), len(failed), time.time() - start))
+        return SUCCESS if not failed else FAILED
+
     def start_db(self, member):
         instance_id = member.get("id")
         instance_dir = member.get("dir")
         logger.info("[INFO]start instance")
+        fresh_standby = self.mode == PRIMARY and not instance_id.endswith("-0")
+        primary = self.members[0]
+        if fresh_standby and self.seed == "probackup" and seed_standby(
+                self.core_v1, self.name, primary.get("id"), primary.get("port"), instance_id) == SUCCESS:
+            # restored from a backup of the primary, it only has to catch up from WAL now
+            if start_by_signal(self.core_v1, instance_id):
+                logger.info("[INFO]create instance(%s) success" % instance_id)
+                return SUCCESS
+            return catch_up_standby(self.core_v1, instance_id)
+        action = "build" if fresh_standby else "start"
+        if start_by_signal(self.core_v1, instance_id, action):
+            logger.info("[INFO]create instance(%s) success" % instance_id)
+            return SUCCESS
         if self.mode == SINGLE:
             startdb_cmd = "%s start -D %s -Z single_node" % (self.gs_ctl_path, instance_dir)
         elif instance_id.endswith("-0"):
             startdb_cmd = "%s start -D %s -M primary" % (self.gs_ctl_path, instance_dir)
         else:
+            # a fresh standby has nothing in common with the primary yet
+            logger.info("[INFO]standby(%s) is new, full build" % instance_id)
             startdb_cmd = "%s build -D %s -b full" % (self.gs_ctl_path, instance_dir)
 
         logger.info(startdb_cmd)
-        result, status = exec_remote_cmd(startdb_cmd, self.core_v1, instance_id, NAMESPACE)
+        result, status = exec_remote_cmd(startdb_cmd, self.core_v1, instance_id, NAMESPACE,
+                                         until="server started|another server")
         if re.search("server started", "\n".join(result)) is not None or \
                 re.search("another server", "\n".join(result)) is not None:
             logger.info("[INFO]create instance(%s) success: %s" % (instance_id, result))
@@ -219,9 +521,13 @@ class CreateDBInstance(Instance):
         logger.info("[INFO]init instance")
         initdb_cmd = "%s -w %s -D %s --nodename '%s' --locale='en_US.UTF-8' -U %s" % (
             self.gs_initdb_path, self.password, instance_dir, "sg_node", USER)
+        if self.golden:
+            initdb_cmd = golden_initdb_cmd(self.gs_initdb_path, self.password, instance_dir, "sg_node",
+                                           "en_US.UTF-8", USER)
         result, status = exec_remote_cmd(initdb_cmd, self.core_v1, instance_id, NAMESPACE)
         result_txt = "\n".join(result)
-        if re.search("error|Error", result_txt) is None and re.search("Success", result_txt) is not None:
+        if status == 0 and re.search("error|Error", result_txt) is None and \
+                re.search("Success", result_txt) is not None:
             logger.info("[INFO]init instance(%s) success" % instance_id)
         else:
             logger.error("[ERROR]init instance(%s) failed: %s" % (instance_id, result))
@@ -239,37 +545,53 @@ class CreateDBInstance(Instance):
             return FAILED
         return SUCCESS
 
+    def render_replconninfo(self, member):
+        lines = []
+        local_host = member.get("host")
+        local_port = int(member.get("port"))
+        for _index, other in enumerate(self.members):
+            if other.get("id") == member.get("id"):
+                continue
+            name = "replconninfo" + str(_index + 1)
+            other_port = int(other.get("port"))
+            lines.append("{0} = '"
+                         "localhost={1} localport={2} localheartbeatport={3} localservice={4} "
+                         "remotehost={5} remoteport={6} remoteheartbeatport={7} remoteservice={8}'"
+                         .format(name,
+                                 local_host, local_port + 1, local_port + 5, local_port + 4,
+                                 other.get("host"), other_port + 1, other_port + 5, other_port + 4))
+        return lines
+
+    def config_member_replconninfo(self, member):
+        instance_id = member.get("id")
+        conf_path = os.path.join(member.get("dir"), "postgresql.conf")
+        # drop the entries of a previous run first, so that reruns replace instead of append
+        replconninfo_cmd = "sed -i '/^replconninfo[0-9]* *=/d' {0} && cat >> {0} <<'GOD_CTL_EOF'\n{1}\nGOD_CTL_EOF".format(
+            conf_path, "\n".join(self.render_replconninfo(member)))
+        result, ret = exec_remote_cmd(replconninfo_cmd, self.core_v1, instance_id, NAMESPACE)
+        if ret:
+            logger.error("[ERROR]config instance(%s) failed: %s" % (instance_id, result))
+            return FAILED
+        return SUCCESS
+
     def config_replconninfo(self):
         # TODO: connect with everyone?
-        for index, member in enumerate(self.members):
-            instance_id = member.get("id")
-            local_host = member.get("host")
-            local_port = int(member.get("port"))
-            for _index, other in enumerate(self.members):
-                if other.get("id") == instance_id:
-                    continue
-                name = "replconninfo" + str(_index + 1)
-                other_port = int(other.get("port"))
-                replconninfo_cmd = "{0} = '" \
-                                   "localhost={1} localport={2} localheartbeatport={3} localservice={4} " \
-                                   "remotehost={5} remoteport={6} remoteheartbeatport={7} remoteservice={8}'" \
-                    .format(name,
-                            local_host, local_port + 1, local_port + 5, local_port + 4,
-                            other.get("host"), other_port + 1, other_port + 5, other_port + 4)
-                result, ret = exec_remote_cmd(
-                    '''echo "%s" >> %s''' % (replconninfo_cmd, os.path.join(member.get("dir"), "postgresql.conf")),
-                    self.core_v1, instance_id, NAMESPACE)
-
-                if ret:
-                    logger.error("[ERROR]config instance(%s) failed: %s" % (instance_id, result))
-                    return FAILED
+        results = run_concurrently(self.config_member_replconninfo, self.members, self.parallel)
+        failed = [member.get("id") for member, ret in results if ret != SUCCESS]
+        if failed:
+            logger.error("[ERROR]config replconninfo of (%s) failed" % ", ".join(failed))
+            return FAILED
         return SUCCESS
 
     def init_instance(self):
-        for member in self.members:
-            if self.init_db(member) != SUCCESS:
-                logger.error("[INFO]Init instance (%s) failed" % member.get("id"))
-                return FAILED
+        if self.golden_refresh and self.golden_refresh(self.core_v1, self.members[0].get("id")) != SUCCESS:
+            return FAILED
+        # gs_initdb is the slowest step, members do not depend on each other here
+        results = run_concurrently(self.init_db, self.members, self.parallel)
+        failed = [member.get("id") for member, ret in results if ret != SUCCESS]
+        if failed:
+            logger.error("[INFO]Init instance (%s) failed" % ", ".join(failed))
+            return FAILED
         if self.mode == PRIMARY:
             if self.config_replconninfo() != SUCCESS:
                 logger.error("[INFO]Config replconninfo failed")
@@ -307,7 +629,10 @@ class DeleteDBInstance(Instance):
             logger.error("[ERROR]delete instance(%s) failed" % instance)
             return FAILED
         else:
-            rmdb_cmd = "rm -rf /home/dbuser/gaussdata/%s-*" % instance  # self.instance_dir
+            # with the data directories go the ready markers and their fifos, a failed seed's restore
+            # directory and the backup catalog, else a new instance of that name skips the handshake
+            rmdb_cmd = "rm -rf {0}/{1}-* {0}/.ready-{1}-* {0}/.seed-{1}-* {0}/.backup/{1}".format(
+                "/home/dbuser/gaussdata", instance)  # self.instance_dir
             _, status = exec_cmd(rmdb_cmd)
             if status != SUCCESS:
                 logger.error("[ERROR]remove instance(%s) dir failed" % instance)
@@ -319,11 +644,14 @@ class DeleteDBInstance(Instance):
 class AddDatabase(Instance):
     def __init__(self):
         super().__init__()
-        self.mandatory = ["instance", "dbnames"]
+        self.mandatory = ["instance"]
         self.dbname_list = None
         self.password = None
         self.port = None
         self.gauss_helper = None
+        self.pool_size = GAUSS_POOL_SIZE
+        self.bulk = False
+        self.parallel = 1
 
     def check_param(self, args_map):
         for item in self.mandatory:
@@ -332,32 +660,25 @@ class AddDatabase(Instance):
                 return FAILED
         instance = args_map.get("instance")
         instance_id = get_id(instance)
-        instance_dir = GS_DATA_PATH + "/" + instance_id
 
         if not is_sts_exist(self.app_v1, instance, NAMESPACE):
             logger.error("[ERROR]Sts (%s) must exist" % instance)
             return FAILED
-        result, status = exec_remote_cmd(
-            "ps -efww | grep -w %s | grep 'gaussdb ' | grep -v grep | awk '{print $2}'" % instance
-            , self.core_v1, instance_id, NAMESPACE)
-        if len(result) == 0:
+        member = probe_member(self.core_v1, instance_id)
+        if not member["running"]:
             logger.error("[ERROR]instance(%s) has not been created or started" % instance_id)
             return FAILED
-        result, status = exec_remote_cmd(
-            "sed -n '/^port/p' %s/postgresql.conf | awk '{print $3}'" % instance_dir,
-            self.core_v1, instance_id, NAMESPACE)
-        self.port = result[-1]
-        db_names = args_map.get("dbnames")
-        if not db_names:
-            logger.error("dbnames(%s) can't be empty" % db_names)
-            return FAILED
-        str_list = db_names.split(',')
-        for item in str_list:
-            if not str(item):
-                logger.error("[ERROR]dbnames(%s) is invalid!" % db_names)
-                return instance
-        self.dbname_list = str_list
+        self.port = member["port"]
+        self.dbname_list = get_dbname_list(args_map)
+        if not self.dbname_list:
+            return FAILED
         self.password = "Changeme_123"
+        self.bulk, self.parallel = get_bulk_mode(args_map)
+        if self.parallel is None:
+            return FAILED
+        self.pool_size = get_positive_int(args_map, "poolsize", max(GAUSS_POOL_SIZE, self.parallel))
+        if self.pool_size is None:
+            return FAILED
 
         return SUCCESS
 
@@ -377,49 +698,64 @@ class AddDatabase(Instance):
     def exec(self, args_map):
         if SUCCESS != self.check_param(args_map):
             return FAILED
-        self.gauss_helper = GaussHelper(self.password, self.port)
+        self.gauss_helper = GaussHelper(self.password, self.port, self.pool_size)
         if self.create_access_db() != SUCCESS:
             return FAILED
-        dbname_list = args_map.get("dbnames").split(',')
+        dbname_list = self.dbname_list
         ret, result = self.gauss_helper.exec_sql("SELECT datname FROM pg_database", fetch=True)
         if not result:
             logger.error("Failed to query the database list")
             return FAILED
         exist_dbnames = [item[0] for item in result]
         duplicate_dbnames = [item for item in dbname_list if item in exist_dbnames]
+        if self.bulk:
+            for dbname in duplicate_dbnames:
+                logger.error("[ERROR]database(%s) already exists" % dbname)
+            new_dbnames = [item for item in dbname_list if item not in duplicate_dbnames]
+            results = [(dbname, FAILED) for dbname in duplicate_dbnames]
+            results += run_concurrently(self.add_database, new_dbnames, self.parallel)
+            return report_results("create database", results)
         if duplicate_dbnames:
             logger.error("[ERROR]The following database(%s) already exists" % duplicate_dbnames)
             return FAILED
         for dbname in dbname_list:
-            sql_add_database = [
-                "REVOKE ALL ON SCHEMA PUBLIC FROM PUBLIC",
-                "CREATE TABLESPACE {0} RELATIVE LOCATION 'tablespace/{0}' MAXSIZE '102400M'".format(dbname),
-                "CREATE USER {0} ENCRYPTED Password '{1}' NOSYSADMIN NOINHERIT CONNECTION LIMIT 500 PERM SPACE '102400M' TEMP SPACE '102400M' SPILL SPACE '102400M';".format(
-                    dbname, self.password),
-                "ALTER TABLESPACE {0} OWNER TO {0}".format(dbname),
-                "ALTER USER {0} SET search_path TO {0}".format(dbname),
-                "ALTER USER {0} SET default_tablespace TO {0}".format(dbname),
-                "CREATE TABLESPACE {0}_tempdb RELATIVE LOCATION 'tablespace/{0}_tempdb' MAXSIZE '102400M'".format(
-                    dbname),
-                "ALTER USER {0} SET temp_tablespaces TO {0}_tempdb".format(dbname)
-            ]
-            for item in sql_add_database:
-                ret, result = self.gauss_helper.exec_sql(item)
-                if not ret:
-                    logger.error("create database(%s) failed" % dbname)
-                    return FAILED
+            if self.add_database(dbname) != SUCCESS:
+                return FAILED
         logger.info("create database(%s) success" % dbname_list)
         return SUCCESS
 
+    def add_database(self, dbname):
+        # CREATE TABLESPACE can't run in a transaction block, so it goes first and the rest shares one batch
+        sql_add_database = [
+            "CREATE TABLESPACE {0} RELATIVE LOCATION 'tablespace/{0}' MAXSIZE '102400M'".format(dbname),
+            "CREATE TABLESPACE {0}_tempdb RELATIVE LOCATION 'tablespace/{0}_tempdb' MAXSIZE '102400M'".format(
+                dbname),
+            "REVOKE ALL ON SCHEMA PUBLIC FROM PUBLIC",
+            "CREATE USER {0} ENCRYPTED Password '{1}' NOSYSADMIN NOINHERIT CONNECTION LIMIT 500 PERM SPACE '102400M' TEMP SPACE '102400M' SPILL SPACE '102400M';".format(
+                dbname, self.password),
+            "ALTER TABLESPACE {0} OWNER TO {0}".format(dbname),
+            "ALTER USER {0} SET search_path TO {0}".format(dbname),
+            "ALTER USER {0} SET default_tablespace TO {0}".format(dbname),
+            "ALTER USER {0} SET temp_tablespaces TO {0}_tempdb".format(dbname)
+        ]
+        ret, failed_sql = self.gauss_helper.exec_batch(sql_add_database)
+        if not ret:
+            logger.error("create database(%s) failed at: %s" % (dbname, failed_sql))
+            return FAILED
+        return SUCCESS
+
 
 class RemoveDatabase(Instance):
     def __init__(self):
         super().__init__()
-        self.mandatory = ["instance", "dbnames"]
+        self.mandatory = ["instance"]
         self.dbname_list = None
         self.password = None
         self.port = None
         self.gauss_helper = None
+        self.pool_size = GAUSS_POOL_SIZE
+        self.bulk = False
+        self.parallel = 1
 
     def check_param(self, args_map):
         for item in self.mandatory:
@@ -428,51 +764,50 @@ class RemoveDatabase(Instance):
                 return FAILED
         instance = args_map.get("instance")
         instance_id = get_id(instance)
-        instance_dir = GS_DATA_PATH + '/' + instance_id
 
-        result, status = exec_remote_cmd(
-            "ps -efww | grep -w %s | grep 'gaussdb ' | grep -v grep | awk '{print $2}'" % instance
-            , self.core_v1, instance_id, NAMESPACE)
-        if len(result) == 0:
+        member = probe_member(self.core_v1, instance_id)
+        if not member["running"]:
             logger.error("[ERROR]instance(%s) has not been created or started" % instance)
             return FAILED
-        result, status = exec_remote_cmd(
-            "sed -n '/^port/p' %s/postgresql.conf | awk '{print $3}'" % instance_dir,
-            self.core_v1, instance_id, NAMESPACE)
-        self.port = result[-1]
-        dbnames = args_map.get("dbnames")
-        if not dbnames:
-            logger.error("dbnames(%s) can't be empty" % dbnames)
-            return FAILED
-        str_list = dbnames.split(',')
-        for item in str_list:
-            if not str(item):
-                logger.error("dbnames(%s) can't be empty" % dbnames)
-                return FAILED
-        self.dbname_list = str_list
+        self.port = member["port"]
+        self.dbname_list = get_dbname_list(args_map)
+        if not self.dbname_list:
+            return FAILED
         self.password = "Changeme_123"
+        self.bulk, self.parallel = get_bulk_mode(args_map)
+        if self.parallel is None:
+            return FAILED
+        self.pool_size = get_positive_int(args_map, "poolsize", max(GAUSS_POOL_SIZE, self.parallel))
+        if self.pool_size is None:
+            return FAILED
         return SUCCESS
 
     def exec(self, args_map):
         if SUCCESS != self.check_param(args_map):
             return FAILED
-        self.gauss_helper = GaussHelper(self.password, self.port)
-        dbname_list = args_map.get("dbnames").split(',')
+        self.gauss_helper = GaussHelper(self.password, self.port, self.pool_size)
+        dbname_list = self.dbname_list
+        if self.bulk:
+            return report_results("delete database", run_concurrently(self.remove_database, dbname_list, self.parallel))
         for dbname in dbname_list:
-            sql_remove_database = [
-                "DROP TABLESPACE {0}_tempdb".format(dbname),
-                "ALTER TABLESPACE {0} OWNER TO {1}".format(dbname, USER),
-                "DROP USER IF EXISTS {0} CASCADE".format(dbname),
-                "DROP TABLESPACE IF EXISTS {0}".format(dbname)
-            ]
-            for item in sql_remove_database:
-                ret, result = self.gauss_helper.exec_sql(item)
-                if not ret:
-                    logger.error("remove database(%s) failed" % dbname)
-                    return FAILED
+            if self.remove_database(dbname) != SUCCESS:
+                return FAILED
         logger.info("delete database(%s) success" % dbname_list)
         return SUCCESS
 
+    def remove_database(self, dbname):
+        sql_remove_database = [
+            "DROP TABLESPACE {0}_tempdb".format(dbname),
+            "ALTER TABLESPACE {0} OWNER TO {1}".format(dbname, USER),
+            "DROP USER IF EXISTS {0} CASCADE".format(dbname),
+            "DROP TABLESPACE IF EXISTS {0}".format(dbname)
+        ]
+        ret, failed_sql = self.gauss_helper.exec_batch(sql_remove_database)
+        if not ret:
+            logger.error("remove database(%s) failed at: %s" % (dbname, failed_sql))
+            return FAILED
+        return SUCCESS
+
 
 class StartDBInstance(Instance):
     def __init__(self):
@@ -480,6 +815,8 @@ class StartDBInstance(Instance):
         self.instance = None
         self.mandatory = ["instance"]
         self.instance_dir = None
+        self.parallel = MAX_PARALLEL
+        self.seed = "build"
 
     def check_param(self, args_map):
         for item in self.mandatory:
@@ -487,6 +824,9 @@ class StartDBInstance(Instance):
                 logger.error("[ERROR]argument(%s) must exist" % item)
                 return FAILED
         self.instance = args_map.get("instance")
+        self.parallel = get_parallel(args_map)
+        if self.parallel is None:
+            return FAILED
         return SUCCESS
 
     def exec(self, args_map):
@@ -501,12 +841,13 @@ class StartDBInstance(Instance):
 
     def start_db_instance(self):
         instance = self.instance
-        if not is_sts_exist(self.app_v1, instance, NAMESPACE):
+        sts = read_sts(self.app_v1, instance, NAMESPACE)
+        if sts is None:
             logger.error("[INFO]Sts (%s) not exists" % instance)
             return FAILED
 
-        sts = self.app_v1.read_namespaced_stateful_set(instance, NAMESPACE)
         replicas = int(sts.metadata.annotations.get('replicas'))
+        self.seed = sts.metadata.annotations.get('seed', "build")
         if replicas == 1:
             self.mode = SINGLE
         else:
@@ -518,49 +859,58 @@ class StartDBInstance(Instance):
         else:
             logger.info("[INFO]Scale instance(%s) success" % instance)
 
-        time_out = 1
-        while time_out != 10 and not is_sts_ready(self.app_v1, instance, NAMESPACE):
-            logger.info("Waiting sts %s ready" % instance)
-            time.sleep(time_out)
-            time_out += 1
-
-        if time_out >= 10:
+        if not wait_sts_ready(self.app_v1, instance, NAMESPACE):
             logger.error("[INFO]Launching sts (%s) failed" % instance)
             delete_sts(self.app_v1, instance)
             return FAILED
 
         logger.info("Sts %s RUNNING" % instance)
 
-        for index in range(replicas):
-            instance_id = instance + "-%s" % index
-            result, status = exec_remote_cmd("ps -efww | grep -w %s | grep 'gaussdb ' | grep -v grep" % instance_id
-                                             , self.core_v1, instance_id, NAMESPACE)
-            if len(result) != 0:
-                logger.info("[INFO]instance(%s) is running" % instance_id)
-                return FAILED
-
-            if SUCCESS != self.start_db(instance_id):
-                logger.error("[INFO]start instance(%s) failed" % instance_id)
-                return FAILED
+        members = probe_instance(self.core_v1, instance, replicas, self.parallel)
+        # the standbys need a primary to connect to, so -0 comes first and must accept connections
+        primary = members[0]
+        if primary["running"]:
+            logger.info("[INFO]instance(%s) is running, skip it" % primary["member"])
+        elif SUCCESS != self.start_db(primary["member"]):
+            logger.error("[INFO]start instance(%s) failed" % primary["member"])
+            return FAILED
+        if not wait_db_accepting(self.core_v1, primary["member"], primary["port"]):
+            logger.error("[ERROR]instance(%s) does not accept connections" % primary["member"])
+            return FAILED
 
+        standbys = []
+        for member in members[1:]:
+            if member["running"]:
+                logger.info("[INFO]instance(%s) is running, skip it" % member["member"])
+            else:
+                standbys.append(member["member"])
+        results = run_concurrently(self.start_db, standbys, self.parallel)
+        failed = [instance_id for instance_id, ret in results if ret != SUCCESS]
+        if failed:
+            logger.error("[INFO]start instance(%s) failed" % ", ".join(failed))
+            return FAILED
         return SUCCESS
 
     def start_db(self, instance_id):
         instance_dir = os.path.join(GS_DATA_PATH + "/" + instance_id)
         logger.info("[INFO]start instance")
+        if start_by_signal(self.core_v1, instance_id):
+            logger.info("[INFO]Start instance(%s) success" % instance_id)
+            return SUCCESS
         if self.mode == SINGLE:
             startdb_cmd = "%s start -D %s -Z single_node" % (self.gs_ctl_path, instance_dir)
         elif instance_id.endswith("-0"):
             startdb_cmd = "%s start -D %s -M primary" % (self.gs_ctl_path, instance_dir)
         else:
-            startdb_cmd = "%s build -D %s -b full" % (self.gs_ctl_path, instance_dir)
+            return catch_up_standby(self.core_v1, instance_id, self.seed)
 
-        result, status = exec_remote_cmd(startdb_cmd, self.core_v1, instance_id, NAMESPACE)
+        result, status = exec_remote_cmd(startdb_cmd, self.core_v1, instance_id, NAMESPACE,
+                                         until="server started|another server")
         if re.search("server started", "\n".join(result)) is not None or \
                 re.search("another server", "\n".join(result)) is not None:
             logger.info("[INFO]Start instance(%s) success: %s" % (instance_id, result))
         else:
-            logger.error("[ERROR]Start instance(%s) failed" % instance_id, result)
+            logger.error("[ERROR]Start instance(%s) failed: %s" % (instance_id, result))
             return FAILED
         return SUCCESS
 
@@ -582,6 +932,8 @@ class StopDBInstance(Instance):
         super().__init__()
         self.instance = None
         self.mandatory = ["instance"]
+        self.fast = False
+        self.parallel = MAX_PARALLEL
 
     def check_param(self, args_map):
         for item in self.mandatory:
@@ -590,6 +942,10 @@ class StopDBInstance(Instance):
                 return FAILED
         instance = args_map.get("instance")
         self.instance = instance
+        self.fast = "fast" in args_map
+        self.parallel = get_parallel(args_map)
+        if self.parallel is None:
+            return FAILED
         return SUCCESS
 
     def exec(self, args_map):
@@ -605,26 +961,24 @@ class StopDBInstance(Instance):
     def stop_db_instance(self):
         instance = self.instance
 
-        if not is_sts_exist(self.app_v1, instance, NAMESPACE):
+        sts = read_sts(self.app_v1, instance, NAMESPACE)
+        if sts is None:
             logger.error("[INFO]Sts (%s) not exist" % instance)
             return FAILED
 
-        replicas = self.app_v1.read_namespaced_stateful_set_scale(instance, NAMESPACE).spec.replicas
+        replicas = sts.spec.replicas
+        members = probe_instance(self.core_v1, instance, replicas, self.parallel)
+        # from now on a restarted pod waits for god_ctl instead of starting its database again
+        reachable = [member["member"] for member in members if member["reachable"]]
+        run_concurrently(lambda instance_id: clear_ready(self.core_v1, instance_id), reachable, self.parallel)
+        if self.fast:
+            return self.fast_stop(members)
         for index in range(replicas - 1, -1, -1):
             instance_id = instance + "-%s" % index
-            instance_dir = os.path.join(GS_DATA_PATH + "/" + instance_id)
-            result, status = exec_remote_cmd("ps -efww | grep -w %s | grep 'gaussdb ' | grep -v grep" % instance_id
-                                             , self.core_v1, instance_id, NAMESPACE)
-            if len(result) == 0:
+            if not members[index]["running"]:
                 logger.info("[INFO]instance(%s) is not running" % instance_id)
             else:
-                stopdb_cmd = "%s stop -D %s" % (self.gs_ctl_path, instance_dir)
-                logger.info(stopdb_cmd)
-                result, status = exec_remote_cmd(stopdb_cmd, self.core_v1, instance_id, NAMESPACE)
-                if re.search("server stopped", "\n".join(result)) is not None:
-                    logger.info("[INFO]stop instance(%s) success" % instance_id)
-                else:
-                    logger.warning("[ERROR]stop instance(%s) failed: %s" % (instance_id, result))
+                self.stop_db(instance_id)
 
             # scale sts to 0
             _, status = scale_sts(self.app_v1, instance, index)
@@ -635,6 +989,190 @@ class StopDBInstance(Instance):
                 logger.info("[INFO]Scale instance(%s) to %s success" % (instance, index))
         return SUCCESS
 
+    def stop_db(self, instance_id, mode=None):
+        instance_dir = os.path.join(GS_DATA_PATH + "/" + instance_id)
+        stopdb_cmd = "%s stop -D %s" % (self.gs_ctl_path, instance_dir)
+        if mode:
+            stopdb_cmd += " -m %s" % mode
+        logger.info(stopdb_cmd)
+        result, status = exec_remote_cmd(stopdb_cmd, self.core_v1, instance_id, NAMESPACE)
+        if re.search("server stopped", "\n".join(result)) is not None:
+            logger.info("[INFO]stop instance(%s) success" % instance_id)
+            return SUCCESS
+        logger.warning("[ERROR]stop instance(%s) failed: %s" % (instance_id, result))
+        return FAILED
+
+    def checkpoint(self, member):
+        # flush the dirty pages now, so that the fast shutdown and the next start have little WAL to replay
+        checkpoint_cmd = "%s -d postgres -p %s -c 'CHECKPOINT'" % (GSQL_PATH, member["port"])
+        result, status = exec_remote_cmd(checkpoint_cmd, self.core_v1, member["member"], NAMESPACE)
+        if status != 0 or re.search("CHECKPOINT", "\n".join(result)) is None:
+            logger.warning("[WARNING]checkpoint of instance(%s) failed: %s" % (member["member"], result))
+            return FAILED
+        logger.info("[INFO]checkpoint of instance(%s) done" % member["member"])
+        return SUCCESS
+
+    def fast_stop(self, members):
+        """Stop all standbys at once, checkpoint and fast stop the primary, then scale the sts to 0 in one call."""
+        instance = self.instance
+        standbys = [member["member"] for member in members[1:] if member["running"]]
+        if standbys:
+            run_concurrently(lambda instance_id: self.stop_db(instance_id, "fast"), standbys, self.parallel)
+        if members and members[0]["running"]:
+            self.checkpoint(members[0])
+            self.stop_db(members[0]["member"], "fast")
+        _, status = scale_sts(self.app_v1, instance, 0)
+        if status != 0:
+            logger.error("[ERROR]Scale sts (%s) to 0 failed" % instance)
+            return FAILED
+        logger.info("[INFO]Scale instance(%s) to 0 success" % instance)
+        return SUCCESS
+
+
+class StatusDBInstance(Instance):
+    def __init__(self):
+        super().__init__()
+        self.instance = None
+        self.json = False
+        self.parallel = STATUS_PARALLEL
+
+    def check_param(self, args_map):
+        if "instance" in args_map and not args_map.get("instance"):
+            logger.error("[ERROR]argument(instance) can't be empty")
+            return FAILED
+        self.instance = args_map.get("instance")
+        self.json = "json" in args_map
+        self.parallel = get_parallel(args_map, STATUS_PARALLEL)
+        if self.parallel is None:
+            return FAILED
+        return SUCCESS
+
+    def exec(self, args_map):
+        if SUCCESS != self.check_param(args_map):
+            return FAILED
+        start = time.time()
+        sts_list, pods = self.collect()
+        if sts_list is None:
+            return FAILED
+
+        rows = []
+        for sts in sts_list:
+            # scaled down members are reported as well, the annotation keeps the size of the instance
+            replicas = int(sts.metadata.annotations.get('replicas'))
+            for index in range(replicas):
+                pod = pods.get("%s-%s" % (sts.metadata.name, index))
+                rows.append({
+                    "instance": sts.metadata.name,
+                    "member": "%s-%s" % (sts.metadata.name, index),
+                    "phase": pod.status.phase if pod else None,
+                    "ready": pod_ready(pod) if pod else False,
+                    "running": False, "role": None, "pid": None, "port": None, "db_state": None,
+                    "replication": None, "lag": None
+                })
+        probe_rows = [row for row in rows if row["phase"] == "Running"]
+        results = run_concurrently(lambda row: probe_member(self.core_v1, row["member"], check_pod=False),
+                                   probe_rows, self.parallel)
+        for row, record in results:
+            if record == FAILED:
+                continue
+            row.update({key: record[key] for key in ("running", "role", "pid", "port", "db_state")})
+            links = record["receivers"] or record["senders"]
+            row["replication"] = ",".join(link.get("state", "") for link in links) or None
+            row["lag"] = replication_lag(record)
+
+        running = len([row for row in rows if row["running"]])
+        logger.info("[INFO]status of %s instances, %s of %s members running, took %.1fs" % (
+            len(sts_list), running, len(rows), time.time() - start))
+        # served from the caches of the daemon, how old the picture is
+        caches = [format_cache(cache) for cache in cache_status()]
+        for cache in caches:
+            logger.info("[INFO]%s" % cache)
+        if self.json:
+            print_screen(json.dumps(rows))
+            return SUCCESS
+        row_format = "%-20s %-24s %-10s %-6s %-8s %-10s %-8s %-6s %-18s %-12s %s"
+        print_screen(row_format % ("INSTANCE", "MEMBER", "PHASE", "READY", "RUNNING", "ROLE", "PID", "PORT",
+                                   "DB_STATE", "REPLICATION", "LAG"))
+        for row in rows:
+            print_screen(row_format % tuple("-" if value is None else value for value in (
+                row["instance"], row["member"], row["phase"], "yes" if row["ready"] else "no",
+                "yes" if row["running"] else "no", row["role"], row["pid"], row["port"],
+                row["db_state"], row["replication"], row["lag"])))
+        for cache in caches:
+            print_screen(cache)
+        return SUCCESS
+
+    def collect(self):
+        """StatefulSets of the instances and their pods by name, with as few apiserver calls as possible."""
+        try:
+            if self.instance:
+                sts = read_sts(self.app_v1, self.instance, NAMESPACE)
+                if sts is None:
+                    logger.error("[ERROR]Sts (%s) not exist" % self.instance)
+                    return None, None
+                names = ["%s-%s" % (self.instance, index) for index in range(sts.spec.replicas)]
+                pods = [read_pod(self.core_v1, name, NAMESPACE) for name in names]
+                return [sts], {pod.metadata.name: pod for pod in pods if pod is not None}
+            sts_cache = get_cache("statefulsets", NAMESPACE)
+            pod_cache = get_cache("pods", NAMESPACE)
+            if sts_cache:
+                sts_list = sts_cache.list()
+            else:
+                sts_list, _ = list_paged(self.app_v1.list_namespaced_stateful_set, NAMESPACE)
+            if pod_cache:
+                pod_list = pod_cache.list()
+            else:
+                pod_list, _ = list_paged(self.core_v1.list_namespaced_pod, NAMESPACE, label_selector="app=gauss")
+        except kube_rest.ApiException as e:
+            logger.error("[ERROR]list instances failed: %s" % e)
+            return None, None
+        # only the StatefulSets created by god_ctl carry the replicas annotation
+        sts_list = [sts for sts in sts_list if (sts.metadata.annotations or {}).get('replicas')]
+        return sorted(sts_list, key=lambda sts: sts.metadata.name), {pod.metadata.name: pod for pod in pod_list}
+
+
+class GoldenRefresh:
+    """Drops the golden data directories once, before the first member of the run is initialized."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.status = None
+
+    def __call__(self, api_instance, instance_id):
+        with self.lock:
+            if self.status is None:
+                result, status = exec_remote_cmd("rm -rf %s" % GOLDEN_PATH, api_instance, instance_id, NAMESPACE)
+                if status != 0:
+                    logger.error("[ERROR]drop golden data directories failed: %s" % result)
+                self.status = SUCCESS if status == 0 else FAILED
+                logger.info("[INFO]golden data directories dropped")
+            return self.status
+
+
+def golden_initdb_cmd(gs_initdb_path, password, instance_dir, nodename, locale, user):
+    """Remote script that clones instance_dir from the golden data directory of these initdb arguments.
+
+    The golden directory is keyed by the gs_initdb version of the image, the
+    locale, nodename, user and a digest of the password, and is built on first
+    use in a temporary directory that is renamed into place, so a concurrent
+    build of the same key never leaves a half-written one behind.
+    """
+    digest = hashlib.sha256(password.encode("utf-8")).hexdigest()[:12]
+    return '''version=$({0} -V | head -n 1 | tr -cs 'A-Za-z0-9.' '_')
+golden={1}/$version-{2}-{3}-{4}-{5}
+if [ ! -d $golden ]; then
+    tmp={1}/.tmp-$(basename $golden)-$$
+    rm -rf $tmp && mkdir -p {1} || exit 1
+    # gs_initdb's own Success banner must not count, only the clone below reports success
+    {0} -w {6} -D $tmp --nodename '{3}' --locale='{2}' -U {4} >&2 || exit 1
+    mv -T $tmp $golden 2>/dev/null || rm -rf $tmp
+fi
+rmdir {7} 2>/dev/null
+if [ -e {7} ]; then echo "Error: {7} exists and is not empty"; exit 1; fi
+# reflink where the filesystem supports it, a plain copy otherwise, never hardlinks: the members write their data files in place
+cp -a --reflink=auto $golden {7} && echo "Success. {7} cloned from $golden"'''.format(
+        gs_initdb_path, GOLDEN_PATH, locale, nodename, user, digest, password, instance_dir)
+
 
 def get_id(instance: str):
     # if instance.endswith(r'-[0-9]'):
@@ -642,61 +1180,681 @@ def get_id(instance: str):
     return instance + '-0'
 
 
-def exec_remote_cmd(command, api_instance, name, namespace):
-    result = []
+def get_positive_int(args_map, name, default):
+    value = args_map.get(name)
+    if value is None:
+        return default
+    if not str(value).isdigit() or int(value) < 1:
+        logger.error("[ERROR]%s(%s) must be a positive integer" % (name, value))
+        return None
+    return int(value)
+
+
+def get_parallel(args_map, default=MAX_PARALLEL):
+    return get_positive_int(args_map, "parallel", default)
+
+
+def get_dbname_list(args_map):
+    """Tenant names from -dbnames (comma separated) and/or -dbfile (comma or whitespace separated)."""
+    if "dbnames" not in args_map and "dbfile" not in args_map:
+        logger.error("[ERROR]argument(dbnames or dbfile) must exist")
+        return None
+    dbnames = args_map.get("dbnames")
+    if "dbnames" in args_map and not dbnames:
+        logger.error("dbnames(%s) can't be empty" % dbnames)
+        return None
+    dbname_list = dbnames.split(',') if dbnames else []
+    for item in dbname_list:
+        if not item:
+            logger.error("[ERROR]dbnames(%s) is invalid!" % dbnames)
+            return None
+    dbfile = args_map.get("dbfile")
+    if "dbfile" in args_map:
+        if not dbfile or not os.path.isfile(dbfile):
+            logger.error("[ERROR]dbfile(%s) does not exist" % dbfile)
+            return None
+        if os.stat(dbfile).st_size > MAX_FILE_SIZES:
+            logger.error("The file size cannot exceed %.2f MB!" % float(MAX_FILE_SIZES / (1024 * 1024)))
+            return None
+        with open(dbfile, encoding="utf-8") as text:
+            dbname_list += [item for item in re.split(r"[,\s]+", text.read()) if item]
+    if not dbname_list:
+        logger.error("[ERROR]no database name is given")
+        return None
+    # keep the first occurrence of a name only
+    return list(dict.fromkeys(dbname_list))
+
+
+def get_bulk_mode(args_map):
+    """Bulk mode (-bulk or -dbfile) works tenants on `parallel` threads and doesn't stop at the first error."""
+    if "bulk" not in args_map and "dbfile" not in args_map:
+        return False, 1
+    return True, get_parallel(args_map)
+
+
+def report_results(action, results):
+    succeeded = [str(item) for item, ret in results if ret == SUCCESS]
+    failed = [str(item) for item, ret in results if ret != SUCCESS]
+    logger.info("[INFO]%s: %s succeeded, %s failed %s" % (action, len(succeeded), len(failed), failed))
+    print_screen(json.dumps({"action": action, "succeeded": succeeded, "failed": failed}))
+    return SUCCESS if not failed else FAILED
+
+
+def run_concurrently(func, items, parallel=MAX_PARALLEL):
+    """Run func(item) for every item on at most `parallel` threads.
+
+    Returns [(item, ret), ...] in the order of items, an exception raised by
+    func is logged and reported as FAILED for that item.
+    """
+    items = list(items)
+    if parallel <= 1 or len(items) <= 1:
+        futures = None
+    else:
+        with ThreadPoolExecutor(max_workers=min(parallel, len(items))) as executor:
+            futures = [executor.submit(bind_request(func), item) for item in items]
+    results = []
+    for index, item in enumerate(items):
+        try:
+            ret = futures[index].result() if futures else func(item)
+        except Exception as e:
+            logger.exception("[ERROR]%s(%s) raised an exception: %s" % (func.__name__, item, e))
+            ret = FAILED
+        results.append((item, ret))
+    return results
+
+
+_exec_local = threading.local()
+
+
+def get_exec_api(api_instance):
+    # stream() swaps api_client.request while it opens the websocket, that is not
+    # thread safe, so worker threads exec through an ApiClient of their own
+    if threading.current_thread() is threading.main_thread():
+        return api_instance
+    exec_api = getattr(_exec_local, "api", None)
+    if exec_api is None:
+        exec_api = _exec_local.api = client.CoreV1Api(new_api_client())
+    return exec_api
+
+
+class PodShell:
+    """One long-lived bash in a pod that runs many commands over a single exec stream.
+
+    Each command runs in a subshell with stdin from /dev/null and is followed by
+    a marker line on stdout (with the exit code) and on stderr, which frames its
+    output. A closed stream is reopened before the next command; a stream that
+    drops while a command runs fails that command, it may or may not have run.
+    A shell runs one command at a time, ShellPool hands it out.
+    """
+
+    def __init__(self, api_instance, name, namespace):
+        self.api_instance = api_instance
+        self.name = name
+        self.namespace = namespace
+        self.resp = None
+        self.sequence = 0
+
+    def connect(self):
+        if self.resp is not None:
+            logger.warning("[WARNING]shell of pod %s dropped, reconnecting" % self.name)
+        self.resp = kube_stream.stream(get_exec_api(self.api_instance).connect_get_namespaced_pod_exec,
+                                       self.name,
+                                       self.namespace,
+                                       command=['bash'],
+                                       stderr=True, stdin=True,
+                                       stdout=True, tty=False,
+                                       _preload_content=False)
+        self.resp.write_stdin("source /home/dbuser/.bashrc\n")
+
+    def close(self):
+        if self.resp is not None:
+            try:
+                self.resp.close()
+            except Exception:
+                logger.error("close shell of pod %s failed" % self.name)
+            self.resp = None
+
+    def iter_run(self, command, output, timeout=SHELL_COMMAND_TIMEOUT):
+        """Yield (channel, line) of command as they arrive and set output.returncode at the end.
+
+        When the caller stops early, the rest of the command's output is read
+        and dropped so that the next command starts in step.
+        """
+        if self.resp is None or not self.resp.is_open():
+            self.connect()
+        self.sequence += 1
+        marker = "__GOD_CTL_%s_%s__" % (os.getpid(), self.sequence)
+        self.resp.write_stdin("(\n%s\n) < /dev/null; echo \"%s $?\"; echo %s >&2\n" % (command, marker, marker))
+        frames = self.read_frames(command, marker, output, timeout)
+        try:
+            for frame in frames:
+                yield frame
+        finally:
+            for _ in frames:
+                pass
+
+    def read_frames(self, command, marker, output, timeout):
+        pending = {"stdout": "", "stderr": ""}
+        # the channels arrive independently, a returncode set by an until match says nothing about stdout
+        stdout_done = stderr_done = False
+        deadline = time.time() + timeout
+        while not stdout_done or not stderr_done:
+            if not self.resp.is_open() or time.time() > deadline:
+                logger.error("[ERROR]shell of pod %s lost command: %s" % (self.name, command))
+                self.close()
+                output.returncode = FAILED
+                return
+            self.resp.update(timeout=1)
+            for channel, line in read_lines(self.resp, pending):
+                # output without a trailing newline shares its line with the marker
+                index = line.find(marker)
+                if index != 0:
+                    yield channel, line if index < 0 else line[:index]
+                if index < 0:
+                    continue
+                if channel == "stdout":
+                    stdout_done = True
+                    if output.returncode is None:
+                        output.returncode = int(line[index + len(marker):])
+                else:
+                    stderr_done = True
+
+
+class ShellPool:
+    """The shells of a pod, every command has one to itself so a long build doesn't hold up a probe.
+
+    Up to size shells are opened on demand and kept for the next commands,
+    with all of them busy a command runs as a one-off exec instead of waiting.
+    """
+
+    def __init__(self, api_instance, name, namespace, size=SHELL_POOL_SIZE):
+        self.api_instance = api_instance
+        self.name = name
+        self.namespace = namespace
+        self.size = size
+        self.shells = []
+        self.idle = []
+        self.lock = threading.Lock()
+
+    def iter_run(self, command, output):
+        with self.lock:
+            if self.idle:
+                shell = self.idle.pop()
+            elif len(self.shells) < self.size:
+                shell = PodShell(self.api_instance, self.name, self.namespace)
+                self.shells.append(shell)
+            else:
+                shell = None
+        if shell is None:
+            logger.info("[INFO]all %s shells of pod %s are busy, exec the command" % (self.size, self.name))
+            yield from iter_exec(command, self.api_instance, self.name, self.namespace, output)
+            return
+        try:
+            yield from shell.iter_run(command, output)
+        finally:
+            with self.lock:
+                self.idle.append(shell)
+
+    def close(self):
+        with self.lock:
+            shells = list(self.shells)
+        for shell in shells:
+            shell.close()
+
+
+_shells = {}
+_shells_lock = threading.Lock()
+_shell_sessions = False
+
+
+def enable_shell_sessions():
+    global _shell_sessions
+    _shell_sessions = True
+
+
+def get_shell_pool(api_instance, name, namespace):
+    with _shells_lock:
+        pool = _shells.get((namespace, name))
+        if pool is None:
+            pool = _shells[(namespace, name)] = ShellPool(api_instance, name, namespace)
+        return pool
+
+
+@atexit.register
+def close_shells():
+    with _shells_lock:
+        pools = list(_shells.values())
+        _shells.clear()
+    for pool in pools:
+        pool.close()
+
+
+class CommandOutput:
+    """The last max_lines lines of a command's output and its exit code."""
+
+    def __init__(self, max_lines=OUTPUT_MAX_LINES):
+        self.lines = collections.deque(maxlen=max_lines)
+        self.dropped = 0
+        self.returncode = None
+
+    def collect(self, lines, until=None):
+        """Keep the lines in the ring buffer, stop at the first line matching the regex until."""
+        try:
+            for line in lines:
+                if len(self.lines) == self.lines.maxlen:
+                    self.dropped += 1
+                self.lines.append(line)
+                if until is not None and re.search(until, line):
+                    # what the caller waits for is there, the exit code doesn't matter any more
+                    self.returncode = SUCCESS
+                    break
+        finally:
+            lines.close()
+        if self.dropped:
+            logger.info("[INFO]%s lines of output dropped, kept the last %s" % (self.dropped, len(self.lines)))
+        return list(self.lines), self.returncode
+
+
+def read_lines(resp, pending):
+    """Yield (channel, line) for every complete line waiting on an exec stream, partial lines stay in pending."""
+    for channel in ("stdout", "stderr"):
+        if not getattr(resp, "peek_" + channel)():
+            continue
+        *complete, pending[channel] = (pending[channel] + getattr(resp, "read_" + channel)()).split("\n")
+        for line in complete:
+            yield channel, line
+
+
+def iter_exec(command, api_instance, name, namespace, output):
     remote_command = [
         'bash',
         '-c',
         'source /home/dbuser/.bashrc && ' +
         command
     ]
-
-    if not is_pod_running(api_instance, name, namespace):
-        logging.error("Pod %s not running in %s" % (name, namespace))
-        return None, FAILED
-
-    logger.info("the remote command to be executed is %s" % command)
-    resp = stream(api_instance.connect_get_namespaced_pod_exec,
+    resp = kube_stream.stream(get_exec_api(api_instance).connect_get_namespaced_pod_exec,
                   name,
                   namespace,
                   command=remote_command,
                   stderr=True, stdin=True,
                   stdout=True, tty=False
                   , _preload_content=False)
-    while resp.is_open():
-        resp.update(timeout=1)
-        if resp.peek_stdout():
-            result.append(resp.read_stdout())
-        if resp.peek_stderr():
-            logger.error("ERROR: %s" % resp.read_stderr())
-    return result, resp.returncode
+    pending = {"stdout": "", "stderr": ""}
+    try:
+        while resp.is_open():
+            resp.update(timeout=1)
+            for frame in read_lines(resp, pending):
+                yield frame
+        for frame in read_lines(resp, pending):
+            yield frame
+        for channel, line in pending.items():
+            if line:
+                yield channel, line
+        output.returncode = resp.returncode
+    finally:
+        resp.close()
+
+
+def iter_remote_cmd(command, api_instance, name, namespace, output, check_pod=True):
+    """Yield the stdout lines of a remote command as they arrive, stderr lines are logged.
+
+    output.returncode is set once the command has finished. Closing the
+    generator early stops reading. check_pod=False skips the pod lookup for
+    callers that have just listed the pod.
+    """
+    if check_pod and not is_pod_running(api_instance, name, namespace):
+        logging.error("Pod %s not running in %s" % (name, namespace))
+        output.returncode = FAILED
+        return
 
+    logger.info("the remote command to be executed is %s" % command)
+    if _shell_sessions:
+        frames = get_shell_pool(api_instance, name, namespace).iter_run(command, output)
+    else:
+        frames = iter_exec(command, api_instance, name, namespace, output)
+    try:
+        for channel, line in frames:
+            if channel == "stderr":
+                logger.error("ERROR: %s" % line)
+            else:
+                yield line
+    finally:
+        frames.close()
+
+
+def exec_remote_cmd(command, api_instance, name, namespace, until=None, max_lines=OUTPUT_MAX_LINES, check_pod=True):
+    output = CommandOutput(max_lines)
+    return output.collect(iter_remote_cmd(command, api_instance, name, namespace, output, check_pod), until)
 
-def exec_cmd(command):
+
+def iter_cmd(command, output):
+    """Yield the output lines of a local command as they arrive, output.returncode is set at the end."""
     logger.info("the command to be executed is %s" % command)
     with subprocess.Popen(command, shell=True, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
                           stderr=subprocess.STDOUT) as process:
         stream = process.stdout
-        result_bytes = stream.readlines()
-        result = []
-        for line in result_bytes:
-            result.append(line.decode(encoding='utf-8').strip('\n'))
-        try:
-            stream.close()
-        except BaseException:
-            logger.error("close stream exception")
-        # wait must be after stream reading, otherwise cmd being executed maybe
-        # blocked if it is print too many strings, which makes pipe full.
         try:
-            process.wait(None)
-        except BaseException:
-            logging.error("process wait get exception")
+            for line in stream:
+                yield line.decode(encoding='utf-8').strip('\n')
+        finally:
             try:
-                process.kill()
-            except OSError as exception:
-                logger.error("process kill get exception")
-        status = process.returncode
-    return result, status
+                stream.close()
+            except BaseException:
+                logger.error("close stream exception")
+            # wait must be after stream reading, otherwise cmd being executed maybe
+            # blocked if it is print too many strings, which makes pipe full.
+            try:
+                process.wait(None)
+            except BaseException:
+                logging.error("process wait get exception")
+                try:
+                    process.kill()
+                except OSError as exception:
+                    logger.error("process kill get exception")
+            output.returncode = process.returncode
+
+
+def exec_cmd(command, until=None, max_lines=OUTPUT_MAX_LINES):
+    output = CommandOutput(max_lines)
+    return output.collect(iter_cmd(command, output), until)
+
+
+# one exec per member: process check on the pid of postmaster.pid, configured
+# port, what init.sh is busy with and, for a running server, the raw gs_ctl query output
+PROBE_CMD = '''dir=%s
+echo "probe.starting=$(cat %s 2>/dev/null)"
+pid=$(head -n 1 $dir/postmaster.pid 2>/dev/null)
+if [ -n "$pid" ] && ps -o args= -p "$pid" 2>/dev/null | grep -q gaussdb; then running=yes; else running=no; fi
+echo "probe.running=$running"
+echo "probe.pid=$pid"
+echo "probe.port=$(awk '/^port/{print $3}' $dir/postgresql.conf 2>/dev/null | tail -n 1)"
+if [ "$running" = yes ]; then %s query -D $dir 2>&1 | sed 's/^/probe.query:/'; fi'''
+
+
+def parse_query(lines):
+    """Turn gs_ctl query output into {"HA state": {...}, "Senders info": [{...}], "Receiver info": [{...}]}."""
+    state = {"HA state": {}, "Senders info": [], "Receiver info": []}
+    section = None
+    for line in lines:
+        match = re.match(r"\s*(HA state|Senders info|Receiver info):", line)
+        if match:
+            section = match.group(1)
+            continue
+        match = re.match(r"\s*(\w+)\s*:\s*(.*?)\s*$", line)
+        if section is None or not match:
+            continue
+        key, value = match.groups()
+        if section == "HA state":
+            state[section][key] = value
+            continue
+        # every sender / receiver entry starts with its pid
+        if not state[section] or key.endswith("_pid"):
+            state[section].append({})
+        state[section][-1][key] = value
+    return state
+
+
+def probe_member(api_instance, instance_id, check_pod=True):
+    """Probe one member with a single exec.
+
+    Returns {"member", "reachable", "running", "starting", "pid", "port",
+    "role", "db_state", "detail", "senders", "receivers"}, starting is what
+    the pod's init.sh is still doing (build, start...) or None, role and the
+    replication fields are only filled for a running server.
+    """
+    record = {"member": instance_id, "reachable": False, "running": False, "starting": None, "pid": None,
+              "port": None, "role": None, "db_state": None, "detail": None, "senders": [], "receivers": []}
+    instance_dir = GS_DATA_PATH + "/" + instance_id
+    result, status = exec_remote_cmd(PROBE_CMD % (instance_dir, STARTING_FILE, GS_CTl_PATH), api_instance, instance_id, NAMESPACE,
+                                     check_pod=check_pod)
+    fields = dict(line[len("probe."):].split("=", 1) for line in result
+                  if line.startswith("probe.") and "=" in line.split(":", 1)[0])
+    if status != 0 or "running" not in fields:
+        logger.warning("[WARNING]probe of instance(%s) failed: %s" % (instance_id, result))
+        return record
+    record["reachable"] = True
+    record["running"] = fields["running"] == "yes"
+    record["starting"] = fields.get("starting") or None
+    record["port"] = fields.get("port") or None
+    if not record["running"]:
+        return record
+    if fields.get("pid", "").isdigit():
+        record["pid"] = int(fields["pid"])
+    state = parse_query([line[len("probe.query:"):] for line in result if line.startswith("probe.query:")])
+    ha_state = state["HA state"]
+    record["role"] = ha_state.get("local_role", "").lower() or None
+    record["db_state"] = ha_state.get("db_state")
+    record["detail"] = ha_state.get("detail_information")
+    record["senders"] = state["Senders info"]
+    record["receivers"] = state["Receiver info"]
+    return record
+
+
+def parse_lsn(location):
+    """'0/3000148' -> 50331976, None for anything that is not an LSN."""
+    match = re.match(r"^([0-9A-Fa-f]+)/([0-9A-Fa-f]+)$", location or "")
+    if not match:
+        return None
+    return (int(match.group(1), 16) << 32) + int(match.group(2), 16)
+
+
+def replication_lag(record):
+    """Bytes the replay of a standby is behind what its primary sent, the largest one of all standbys for a primary."""
+    lags = []
+    for link in record["receivers"] or record["senders"]:
+        sent = parse_lsn(link.get("sender_sent_location"))
+        replayed = parse_lsn(link.get("receiver_replay_location"))
+        if sent is not None and replayed is not None:
+            lags.append(max(sent - replayed, 0))
+    return max(lags) if lags else None
+
+
+def wait_db_accepting(api_instance, instance_id, port, timeout=DB_READY_TIMEOUT):
+    """Wait in one exec until the member answers a query on its port."""
+    wait_cmd = ("for i in $(seq %s); do %s -d postgres -p %s -c 'SELECT 1' >/dev/null 2>&1 "
+                "&& echo accepting && exit 0; sleep 1; done; exit 1") % (timeout, GSQL_PATH, port)
+    result, status = exec_remote_cmd(wait_cmd, api_instance, instance_id, NAMESPACE, until="accepting")
+    if status != 0:
+        logger.error("[ERROR]instance(%s) does not accept connections in %ss" % (instance_id, timeout))
+        return False
+    logger.info("[INFO]instance(%s) accepts connections" % instance_id)
+    return True
+
+
+def ready_file(instance_id):
+    return "%s/.ready-%s" % (GS_DATA_PATH, instance_id)
+
+
+def signal_ready(api_instance, instance_id, action="start"):
+    """Write the ready marker of a member and wake up its init.sh, True if the pod was waiting for it.
+
+    action is "start", or "build" for a fresh standby that needs a full build.
+    """
+    signal_cmd = ("echo {1} > {0} && if [ -p {0}.fifo ]; then "
+                  "timeout 5 bash -c 'echo {1} > {0}.fifo' && echo signalled; fi").format(ready_file(instance_id), action)
+    result, status = exec_remote_cmd(signal_cmd, api_instance, instance_id, NAMESPACE)
+    return status == 0 and "signalled" in result
+
+
+def clear_ready(api_instance, instance_id):
+    result, status = exec_remote_cmd("rm -f %s" % ready_file(instance_id), api_instance, instance_id, NAMESPACE)
+    return SUCCESS if status == 0 else FAILED
+
+
+def start_by_signal(api_instance, instance_id, action="start"):
+    """Let the pod start its own database, False means the caller has to start it by exec.
+
+    Past the timeout the caller only takes over once init.sh has given up,
+    as long as it still builds or starts the member an exec start would run
+    on the same data directory at the same time. The same holds for a pod
+    that didn't wait for the signal: a restarted one already catches up on
+    its own.
+    """
+    if signal_ready(api_instance, instance_id, action):
+        # a full build copies the whole primary, give it the time of a pod start
+        timeout = HANDSHAKE_TIMEOUT if action == "start" else STS_READY_TIMEOUT
+    else:
+        member = probe_member(api_instance, instance_id)
+        if not member["starting"]:
+            logger.info("[INFO]pod of instance(%s) is not waiting for a signal, start by exec" % instance_id)
+            return False
+        logger.info("[INFO]pod of instance(%s) is already busy with %s, waiting for it" % (
+            instance_id, member["starting"]))
+        timeout = 0
+    start = time.time()
+    reported = 0
+    while True:
+        member = probe_member(api_instance, instance_id)
+        if member["running"]:
+            logger.info("[INFO]instance(%s) started by its pod" % instance_id)
+            return True
+        elapsed = time.time() - start
+        if elapsed >= timeout:
+            if not member["starting"]:
+                break
+            if elapsed - reported >= HANDSHAKE_TIMEOUT:
+                reported = elapsed
+                logger.info("[INFO]pod of instance(%s) is still busy with %s after %ds, waiting for it" % (
+                    instance_id, member["starting"], elapsed))
+        time.sleep(1)
+    logger.warning("[WARNING]instance(%s) still not running after %ds, start by exec" % (
+        instance_id, time.time() - start))
+    return False
+
+
+def standby_streaming(api_instance, instance_id, timeout=STANDBY_CATCHUP_TIMEOUT):
+    """Whether a started standby replicates from its primary (db_state Normal or Catchup)."""
+    deadline = time.time() + timeout
+    while True:
+        member = probe_member(api_instance, instance_id)
+        if member["running"] and member["db_state"] in ("Normal", "Catchup"):
+            return True
+        # Need repair: the primary no longer has the WAL or the timelines diverged
+        if member["db_state"] == "Need repair" or time.time() > deadline:
+            logger.info("[INFO]standby(%s) is not streaming: %s %s" % (
+                instance_id, member["db_state"], member["detail"]))
+            return False
+        time.sleep(2)
+
+
+def build_standby(api_instance, instance_id, mode):
+    instance_dir = GS_DATA_PATH + "/" + instance_id
+    # build wants the data directory to itself
+    build_cmd = "%s stop -D %s -m fast >/dev/null 2>&1; %s build -D %s -b %s" % (
+        GS_CTl_PATH, instance_dir, GS_CTl_PATH, instance_dir, mode)
+    logger.info(build_cmd)
+    result, status = exec_remote_cmd(build_cmd, api_instance, instance_id, NAMESPACE, until="server started")
+    if re.search("server started", "\n".join(result)) is None:
+        logger.warning("[WARNING]%s build of standby(%s) failed: %s" % (mode, instance_id, result))
+        return FAILED
+    return SUCCESS
+
+
+def start_standby(api_instance, instance_id):
+    instance_dir = GS_DATA_PATH + "/" + instance_id
+    start_cmd = "%s start -D %s -M standby" % (GS_CTl_PATH, instance_dir)
+    logger.info(start_cmd)
+    result, status = exec_remote_cmd(start_cmd, api_instance, instance_id, NAMESPACE,
+                                     until="server started|another server")
+    if re.search("server started|another server", "\n".join(result)) is None:
+        return FAILED
+    return SUCCESS if standby_streaming(api_instance, instance_id) else FAILED
+
+
+def catch_up_standby(api_instance, instance_id, seed="build"):
+    """Bring an existing standby back as cheaply as possible.
+
+    An intact standby just starts and streams the WAL it missed, otherwise
+    an incremental build copies the changed pages. The last resort is a
+    full build, or a restore of a gs_probackup backup of the primary for
+    instances seeded that way.
+    """
+    if start_standby(api_instance, instance_id) == SUCCESS:
+        logger.info("[INFO]standby(%s) started, catching up by streaming" % instance_id)
+        return SUCCESS
+    if build_standby(api_instance, instance_id, "incremental") == SUCCESS and \
+            standby_streaming(api_instance, instance_id):
+        logger.info("[INFO]standby(%s) caught up by an incremental build" % instance_id)
+        return SUCCESS
+    if seed == "probackup":
+        instance = instance_id.rsplit("-", 1)[0]
+        primary = probe_member(api_instance, instance + "-0")
+        if primary["running"] and \
+                seed_standby(api_instance, instance, primary["member"], primary["port"], instance_id) == SUCCESS and \
+                start_standby(api_instance, instance_id) == SUCCESS:
+            logger.info("[INFO]standby(%s) restored from a backup of the primary" % instance_id)
+            return SUCCESS
+    logger.warning("[WARNING]standby(%s) can't catch up incrementally, full build" % instance_id)
+    if build_standby(api_instance, instance_id, "full") != SUCCESS:
+        logger.error("[ERROR]Start instance(%s) failed" % instance_id)
+        return FAILED
+    logger.info("[INFO]standby(%s) rebuilt by a full build" % instance_id)
+    return SUCCESS
+
+
+def seed_standby(api_instance, instance, primary_id, primary_port, standby_id, jobs=PROBACKUP_JOBS):
+    """Fill a stopped standby from a parallel, compressed gs_probackup backup of its primary.
+
+    gs_probackup reads the data files locally, so the backup runs in the
+    primary's pod into a catalog on the data volume and the standby's pod
+    restores it from there. The standby keeps its own postgresql.conf and
+    pg_hba.conf, a failed restore leaves its data directory as it was. The
+    primary trusts local replication for the duration of the backup only.
+    """
+    catalog = "%s/%s" % (BACKUP_PATH, instance)
+    primary_dir = GS_DATA_PATH + "/" + primary_id
+    standby_dir = GS_DATA_PATH + "/" + standby_id
+    # the WAL of the backup is streamed over a local replication connection, a line
+    # we add comes out again however the backup ends
+    hba_line = "local replication %s trust" % USER
+    backup_cmd = '''if ! grep -qxF '{hba_line}' {dir}/pg_hba.conf; then
+    echo '{hba_line}' >> {dir}/pg_hba.conf && {gs_ctl} reload -D {dir} >/dev/null 2>&1
+    trap "sed -i '/^{hba_line}\$/d' {dir}/pg_hba.conf && {gs_ctl} reload -D {dir} >/dev/null 2>&1" EXIT
+fi
+mkdir -p {backup_path}
+[ -d {catalog}/backups ] || {probackup} init -B {catalog} 2>&1 || exit 1
+[ -d {catalog}/backups/{instance} ] || {probackup} add-instance -B {catalog} -D {dir} --instance {instance} 2>&1 || exit 1
+{probackup} backup -B {catalog} --instance {instance} -b FULL --stream -j {jobs} --compress-algorithm=zlib --compress-level=1 -p {port} -d postgres 2>&1'''.format(
+        hba_line=hba_line, dir=primary_dir, gs_ctl=GS_CTl_PATH, backup_path=BACKUP_PATH, catalog=catalog,
+        probackup=GS_PROBACKUP_PATH, instance=instance, jobs=jobs, port=primary_port)
+    start = time.time()
+    result, status = exec_remote_cmd(backup_cmd, api_instance, primary_id, NAMESPACE)
+    match = re.search(r"[Bb]ackup (\w+) completed", "\n".join(result))
+    if status != 0 or not match:
+        logger.warning("[WARNING]backup of instance(%s) failed: %s" % (primary_id, result))
+        return FAILED
+    backup_id = match.group(1)
+    backup_seconds = time.time() - start
+
+    # swapped in only when complete, the full build after a failed restore needs the standby's replconninfo
+    restore_dir = "%s/.seed-%s" % (GS_DATA_PATH, standby_id)
+    restore_cmd = '''rm -rf {restore_dir} && {probackup} restore -B {catalog} --instance {instance} -D {restore_dir} -i {backup_id} -j {jobs} 2>&1 || {{ rm -rf {restore_dir}; exit 1; }}
+cp {dir}/postgresql.conf {dir}/pg_hba.conf {restore_dir}/ || {{ rm -rf {restore_dir}; exit 1; }}
+{gs_ctl} stop -D {dir} -m fast >/dev/null 2>&1
+rm -rf {dir} && mv -T {restore_dir} {dir} || exit 1
+{probackup} delete -B {catalog} --instance {instance} -i {backup_id} >/dev/null 2>&1
+echo "seed.bytes=$(du -sb {dir} | cut -f1)"'''.format(
+        restore_dir=restore_dir, dir=standby_dir, gs_ctl=GS_CTl_PATH, probackup=GS_PROBACKUP_PATH,
+        catalog=catalog, instance=instance, backup_id=backup_id, jobs=jobs)
+    start = time.time()
+    result, status = exec_remote_cmd(restore_cmd, api_instance, standby_id, NAMESPACE)
+    sizes = [line[len("seed.bytes="):] for line in result if line.startswith("seed.bytes=")]
+    if status != 0 or not sizes or not sizes[-1].isdigit():
+        logger.warning("[WARNING]restore of standby(%s) failed: %s" % (standby_id, result))
+        return FAILED
+    restore_seconds = time.time() - start
+    size_mb = int(sizes[-1]) / 1024.0 / 1024.0
+    logger.info("[INFO]standby(%s) seeded from backup %s of %s: %.1f MB, backup %.1fs, restore %.1fs, %.1f MB/s" % (
+        standby_id, backup_id, primary_id, size_mb, backup_seconds, restore_seconds,
+        size_mb / max(backup_seconds + restore_seconds, 0.001)))
+    return SUCCESS
+
+
+def probe_instance(api_instance, instance, replicas, parallel=MAX_PARALLEL):
+    """Probe all members of an instance concurrently, records in member order."""
+    members = ["%s-%s" % (instance, index) for index in range(replicas)]
+    results = run_concurrently(lambda instance_id: probe_member(api_instance, instance_id), members, parallel)
+    return [record for _, record in results]
 
 
 def _get_args_map(command_args):
@@ -722,6 +1880,10 @@ def _get_args_map(command_args):
 def print_screen(content, append_new_line=True):
     if append_new_line:
         content += "\n"
+    output = getattr(_request_local, "output", None)
+    if output is not None:
+        output.write(content)
+        return
     sys.stdout.write(content)
     sys.stdout.flush()
 
@@ -768,44 +1930,65 @@ def get_file(path):
         return None
 
 
-def is_pod_exist(api_instance, name, namespace, depth=0) -> bool:
+def read_pod(api_instance, name, namespace, depth=0):
+    """Return the pod or None if it does not exist."""
+    cache = get_cache("pods", namespace)
+    if cache:
+        return cache.get(name)
     if depth == 5:
         logging.error("Kubernetes api failed too many times.")
         exit(1)
     try:
-        resp = api_instance.list_namespaced_pod(namespace=namespace)
-        name_list = [pod.metadata.name for pod in resp.items]
-        return name in name_list
-    except ApiException as e:
-        if e.status != 404:
+        return api_instance.read_namespaced_pod(name=name, namespace=namespace)
+    except kube_rest.ApiException as e:
+        if e.status == 404:
+            return None
+        if e.status not in RETRY_STATUS:
             logging.error("Unknown error: %s" % e)
             exit(1)
-        else:
-            logging.warning("kubernetes.client.exceptions.ApiException: %s" % e)
-            return is_pod_exist(api_instance, name, namespace, depth + 1)
+        logging.warning("kubernetes.client.exceptions.ApiException: %s" % e)
+        time.sleep(depth + 1)
+        return read_pod(api_instance, name, namespace, depth + 1)
+
+
+def is_pod_exist(api_instance, name, namespace) -> bool:
+    return read_pod(api_instance, name, namespace) is not None
 
 
 def is_pod_running(api_instance, name, namespace) -> bool:
-    if not is_pod_exist(api_instance, name, namespace):
+    pod = read_pod(api_instance, name, namespace)
+    if pod is None:
         logging.error("Pod %s does not exist in %s" % (name, namespace))
         return False
-    try:
-        resp = api_instance.read_namespaced_pod(name=name, namespace=namespace)
-        return resp.status.phase == "Running"
-    except ApiException as e:
-        if e.status != 404:
-            logging.error("Unknown error: %s" % e)
-            exit(1)
-        else:
-            logging.warning("kubernetes.client.exceptions.ApiException: %s" % e)
-            return False
+    return pod.status.phase == "Running"
+
+
+def list_paged(list_func, namespace, limit=PAGE_LIMIT, **kwargs):
+    """List every item of a namespaced list call, fetching `limit` items per request.
 
+    Returns (items, resource_version) where resource_version is the one of the
+    list snapshot and can be used to start a watch.
+    """
+    items = []
+    _continue = None
+    while True:
+        if _continue:
+            kwargs["_continue"] = _continue
+        resp = list_func(namespace, limit=limit, **kwargs)
+        items.extend(resp.items)
+        _continue = resp.metadata._continue
+        if not _continue:
+            return items, resp.metadata.resource_version
 
-def gen_template(instance, replicas):
+
+def gen_template(instance, replicas, pod_management_policy=None, seed=None):
     if replicas == 1:
         single = "true"
     else:
         single = "false"
+    if pod_management_policy is None:
+        # the members wait for god_ctl's start signal anyway, no need to create them one after another
+        pod_management_policy = "Parallel" if replicas > 1 else "OrderedReady"
     return {
         'apiVersion': 'apps/v1',
         'kind': 'StatefulSet',
@@ -813,7 +1996,8 @@ def gen_template(instance, replicas):
             'name': instance,
             'namespace': NAMESPACE,
             'annotations': {
-                'replicas': str(replicas)
+                'replicas': str(replicas),
+                'seed': seed or "build"
             }
         },
         'spec': {
@@ -824,6 +2008,7 @@ def gen_template(instance, replicas):
             },
             'serviceName': 'gauss-svc',
             'replicas': replicas,
+            'podManagementPolicy': pod_management_policy,
             'template': {
                 'metadata': {
                     'labels': {
@@ -832,14 +2017,16 @@ def gen_template(instance, replicas):
                 },
                 'spec': {
                     'hostNetwork': True,
-                    'terminationGracePeriodSeconds': 10,
+                    # time for supervisor.py's gs_ctl stop -m fast on SIGTERM, init.sh is exec'd so that it
+                    # replaces the bash of PID 1, which ignores the signal
+                    'terminationGracePeriodSeconds': 60,
                     'nodeSelector': {
                         'cloudsop/agent-type': 'Base'
                     },
                     'containers': [
                         {
                             'command': ['/bin/bash', '-c'],
-                            'args': ['source ~/.bashrc && bash ./data/init.sh'],
+                            'args': ['source ~/.bashrc && exec bash ./data/init.sh'],
                             'env': [
                                 {
                                     'name': 'GAUSS_ROOT',
@@ -869,6 +2056,16 @@ def gen_template(instance, replicas):
                             'name': instance,
                             'image': 'qqq:latest',
                             'imagePullPolicy': 'Never',
+                            # health files written by init.sh and supervisor.py of the image
+                            'readinessProbe': {
+                                'exec': {'command': ['test', '-f', GAUSS_ROOT + '/run/ready']},
+                                'periodSeconds': 2
+                            },
+                            'livenessProbe': {
+                                'exec': {'command': ['test', '-f', GAUSS_ROOT + '/run/alive']},
+                                'initialDelaySeconds': 10,
+                                'periodSeconds': 5
+                            },
                             # 'ports': [{'containerPort': 80, 'name': 'default'}],
                             'volumeMounts': [
                                 {
@@ -896,170 +2093,776 @@ def gen_template(instance, replicas):
     }
 
 
-def is_sts_exist(api_instance, name, namespace, depth=0) -> bool:
+def read_sts(api_instance, name, namespace, depth=0):
+    """Return the StatefulSet or None if it does not exist."""
+    cache = get_cache("statefulsets", namespace)
+    if cache:
+        return cache.get(name)
     if depth == 5:
         logging.error("Kubernetes api failed too many times.")
         exit(1)
     try:
-        resp = api_instance.list_namespaced_stateful_set(namespace=namespace)
-        name_list = [sts.metadata.name for sts in resp.items]
-        return name in name_list
-    except ApiException as e:
-        if e.status != 404:
+        return api_instance.read_namespaced_stateful_set(name=name, namespace=namespace)
+    except kube_rest.ApiException as e:
+        if e.status == 404:
+            return None
+        if e.status not in RETRY_STATUS:
             logging.error("Unknown error: %s" % e)
             exit(1)
-        else:
-            logging.warning("kubernetes.client.exceptions.ApiException: %s" % e)
-            return is_sts_exist(api_instance, name, namespace, depth + 1)
+        logging.warning("kubernetes.client.exceptions.ApiException: %s" % e)
+        time.sleep(depth + 1)
+        return read_sts(api_instance, name, namespace, depth + 1)
+
+
+def is_sts_exist(api_instance, name, namespace) -> bool:
+    return read_sts(api_instance, name, namespace) is not None
 
 
 def is_sts_ready(api_instance, name, namespace) -> bool:
-    if not is_sts_exist(api_instance, name, namespace):
+    sts = read_sts(api_instance, name, namespace)
+    if sts is None:
         logging.error("StatefulSet %s does not exist in %s" % (name, namespace))
         return False
-    try:
-        resp = api_instance.read_namespaced_stateful_set(name=name, namespace=namespace)
-        return resp.status.ready_replicas is not None and resp.status.ready_replicas == resp.spec.replicas
-    except ApiException as e:
-        if e.status != 404:
-            logging.error("Unknown error: %s" % e)
-            exit(1)
-        else:
-            logging.warning("kubernetes.client.exceptions.ApiException: %s" % e)
+    return sts_ready(sts)
+
+
+def sts_ready(sts) -> bool:
+    return sts.status.ready_replicas is not None and sts.status.ready_replicas == sts.spec.replicas
+
+
+def pod_ready(pod) -> bool:
+    if pod.status.phase != "Running":
+        return False
+    return any(condition.type == "Ready" and condition.status == "True"
+               for condition in pod.status.conditions or [])
+
+
+def wait_for_object(list_func, name, namespace, predicate, timeout) -> bool:
+    """Wait until predicate(object) holds for the named object or the deadline passes.
+
+    The object is listed once by name and then watched from that
+    resourceVersion, so the wait ends on the first event that satisfies the
+    predicate instead of on the next poll.
+    """
+    deadline = time.time() + timeout
+    field_selector = "metadata.name=%s" % name
+    resource_version = None
+    while True:
+        remaining = int(deadline - time.time())
+        if remaining <= 0:
             return False
+        w = watch.Watch()
+        try:
+            if resource_version is None:
+                resp = list_func(namespace, field_selector=field_selector)
+                if resp.items and predicate(resp.items[0]):
+                    return True
+                resource_version = resp.metadata.resource_version
+            for event in w.stream(list_func, namespace, field_selector=field_selector,
+                                  resource_version=resource_version, timeout_seconds=remaining):
+                if event["type"] not in ("ADDED", "MODIFIED"):
+                    continue
+                resource_version = event["object"].metadata.resource_version
+                if predicate(event["object"]):
+                    return True
+        except kube_rest.ApiException as e:
+            if e.status != 410:
+                logging.error("Unknown error: %s" % e)
+                exit(1)
+            # the resourceVersion is too old, list again
+            logging.warning("kubernetes.client.exceptions.ApiException: %s" % e)
+            resource_version = None
+        finally:
+            w.stop()
+
+
+def iter_ready(list_func, names, namespace, predicate, timeout, kind=None):
+    """Yield each of names once predicate(object) holds for it, until all did or the deadline passes.
+
+    The namespace is listed once and watched from that resourceVersion, one
+    watch serves all names. With the cache of `kind` running nothing is
+    listed at all.
+    """
+    pending = set(names)
+    deadline = time.time() + timeout
+    cache = get_cache(kind, namespace) if kind else None
+    if cache:
+        while pending:
+            ready = cache.wait_any(pending, predicate, deadline - time.time())
+            if not ready:
+                return
+            pending -= ready
+            for name in sorted(ready):
+                yield name
+        return
+    resource_version = None
+    while pending:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return
+        w = watch.Watch()
+        try:
+            if resource_version is None:
+                items, resource_version = list_paged(list_func, namespace)
+                for item in items:
+                    if item.metadata.name in pending and predicate(item):
+                        pending.discard(item.metadata.name)
+                        yield item.metadata.name
+                if not pending:
+                    return
+            for event in w.stream(list_func, namespace, resource_version=resource_version,
+                                  timeout_seconds=max(int(remaining), 1)):
+                if event["type"] not in ("ADDED", "MODIFIED"):
+                    continue
+                obj = event["object"]
+                resource_version = obj.metadata.resource_version
+                if obj.metadata.name in pending and predicate(obj):
+                    pending.discard(obj.metadata.name)
+                    yield obj.metadata.name
+                    if not pending:
+                        return
+        except kube_rest.ApiException as e:
+            # 410: the resourceVersion is too old; anything else may pass, the deadline bounds the retries.
+            # either way list again, the caller waits on several objects and must not die with one error
+            logging.warning("kubernetes.client.exceptions.ApiException: %s" % e)
+            if e.status != 410:
+                time.sleep(1)
+            resource_version = None
+        finally:
+            w.stop()
+
+
+def wait_sts_ready(api_instance, name, namespace, timeout=STS_READY_TIMEOUT) -> bool:
+    logger.info("Waiting sts %s ready" % name)
+    cache = get_cache("statefulsets", namespace)
+    if cache:
+        ready = cache.wait_for(name, sts_ready, timeout)
+    else:
+        ready = wait_for_object(api_instance.list_namespaced_stateful_set, name, namespace, sts_ready, timeout)
+    if not ready:
+        logging.error("StatefulSet %s is not ready in %ss" % (name, timeout))
+        return False
+    return True
 
 
-def create_sts(api_instance, instance, replicas):
-    sts = gen_template(instance, replicas)
-    if is_sts_exist(api_instance, instance, NAMESPACE):
-        logging.error("Sts %s exists in %s" % (instance, NAMESPACE))
+def create_sts(api_instance, instance, replicas, pod_management_policy=None, seed=None, depth=0):
+    """Create the StatefulSet of instance, (resp, SUCCESS) or (None, FAILED); never exits, a fleet goes on without it."""
+    if depth == 5:
+        logging.error("Kubernetes api failed too many times, sts %s not created" % instance)
         return None, FAILED
+    sts = gen_template(instance, replicas, pod_management_policy, seed)
     try:
         resp = api_instance.create_namespaced_stateful_set(NAMESPACE, sts)
+        cache = get_cache("statefulsets", NAMESPACE)
+        if cache:
+            cache.update(resp)
         logging.info("Create sts %s in %s, sts readyReplicas: %s" % (instance, NAMESPACE, resp.status.ready_replicas))
         return resp, SUCCESS
-    except ApiException as e:
-        if e.status != 404:
-            logging.error("Unknown error: %s" % e)
-            exit(1)
-        else:
-            logging.warning("kubernetes.client.exceptions.ApiException: %s" % e)
+    except kube_rest.ApiException as e:
+        if e.status == 409 and depth > 0:
+            # the failed attempt before went through after all
+            logging.warning("Sts %s was created by a retried request" % instance)
+            return read_sts(api_instance, instance, NAMESPACE), SUCCESS
+        if e.status == 409:
+            logging.error("Sts %s exists in %s" % (instance, NAMESPACE))
             return None, FAILED
+        if e.status in RETRY_STATUS:
+            logging.warning("kubernetes.client.exceptions.ApiException: %s" % e)
+            time.sleep(depth + 1)
+            return create_sts(api_instance, instance, replicas, pod_management_policy, seed, depth + 1)
+        logging.error("Create sts %s failed: %s" % (instance, e))
+        return None, FAILED
 
 
 def delete_sts(api_instance, instance):
-    if not is_sts_exist(api_instance, instance, NAMESPACE):
-        logging.error("Sts %s does not exist in %s" % (instance, NAMESPACE))
-        return None, FAILED
     try:
         resp = api_instance.delete_namespaced_stateful_set(instance, NAMESPACE)
         logging.info("Delete sts %s from %s, action status: %s" % (instance, NAMESPACE, resp.status))
         return resp, SUCCESS
-    except ApiException as e:
+    except kube_rest.ApiException as e:
         if e.status != 404:
             logging.error("Unknown error: %s" % e)
             exit(1)
         else:
-            logging.warning("kubernetes.client.exceptions.ApiException: %s" % e)
-            return None, SUCCESS
+            logging.error("Sts %s does not exist in %s" % (instance, NAMESPACE))
+            return None, FAILED
 
 
 def scale_sts(api_instance, instance, replicas):
-    # # 为什么是这么写的？而不是read
-    # body = gen_template(instance, replicas)
-    # body['spec']['replicas'] = replicas
-    if not is_sts_exist(api_instance, instance, NAMESPACE):
-        logging.error("Sts %s does not exist in %s" % (instance, NAMESPACE))
-        return None, FAILED
+    # only the scale subresource is patched, no need to read the whole sts first
+    body = {'spec': {'replicas': replicas}}
     try:
-        # 改为read
-        body = api_instance.read_namespaced_stateful_set(instance, NAMESPACE)
-        body.spec.replicas = replicas
-        
-        resp = api_instance.patch_namespaced_stateful_set(instance, NAMESPACE, body)
+        resp = api_instance.patch_namespaced_stateful_set_scale(instance, NAMESPACE, body)
         logging.info("Scale sts %s to %s, now the replicas is: %s" % (instance, replicas, resp.spec.replicas))
         return resp, SUCCESS
-    except ApiException as e:
+    except kube_rest.ApiException as e:
         if e.status != 404:
             logging.error("Unknown error: %s" % e)
             exit(1)
         else:
-            logging.warning("kubernetes.client.exceptions.ApiException: %s" % e)
-            return None, FALSE
+            logging.error("Sts %s does not exist in %s" % (instance, NAMESPACE))
+            return None, FAILED
+
+
+class ResourceCache:
+    """Informer style cache of the pods or StatefulSets of one namespace.
+
+    The objects are listed once and then kept current by a watch that resumes
+    from the last seen resourceVersion, a 410 Gone answer triggers a relist.
+    Reads are served from memory, mutations still go to the apiserver.
+    """
+
+    def __init__(self, kind, list_func, namespace, **list_kwargs):
+        self.kind = kind
+        self.list_func = list_func
+        self.namespace = namespace
+        self.list_kwargs = list_kwargs
+        self.objects = {}
+        self.resource_version = None
+        self.last_sync = None
+        self.watching = False
+        self.stopped = False
+        self.synced = threading.Event()
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self.run, name="cache-%s" % kind, daemon=True)
+
+    def start(self, timeout=STS_READY_TIMEOUT):
+        self.thread.start()
+        if not self.synced.wait(timeout):
+            logger.error("[ERROR]cache of %s is not synced in %ss" % (self.kind, timeout))
+            return FAILED
+        return SUCCESS
+
+    def stop(self):
+        self.stopped = True
+
+    def relist(self):
+        items, resource_version = list_paged(self.list_func, self.namespace, **self.list_kwargs)
+        with self.condition:
+            self.objects = {item.metadata.name: item for item in items}
+            self.resource_version = resource_version
+            self.last_sync = time.time()
+            self.condition.notify_all()
+        self.synced.set()
+        logger.info("[INFO]cache of %s listed %s objects at %s" % (self.kind, len(items), resource_version))
+
+    def run(self):
+        while not self.stopped:
+            w = watch.Watch()
+            try:
+                if self.resource_version is None:
+                    self.relist()
+                self.watching = True
+                for event in w.stream(self.list_func, self.namespace, resource_version=self.resource_version,
+                                      timeout_seconds=CACHE_WATCH_TIMEOUT, allow_watch_bookmarks=True,
+                                      **self.list_kwargs):
+                    self.apply(event)
+                    if self.stopped:
+                        break
+            except kube_rest.ApiException as e:
+                if e.status == 410:
+                    self.resource_version = None
+                else:
+                    logger.warning("[WARNING]watch %s failed: %s" % (self.kind, e))
+                    time.sleep(1)
+            except Exception as e:
+                logger.warning("[WARNING]watch %s failed: %s" % (self.kind, e))
+                time.sleep(1)
+            finally:
+                self.watching = False
+                w.stop()
+
+    def apply(self, event):
+        obj = event["object"]
+        with self.condition:
+            if event["type"] == "DELETED":
+                self.objects.pop(obj.metadata.name, None)
+            elif event["type"] in ("ADDED", "MODIFIED"):
+                self.objects[obj.metadata.name] = obj
+            self.resource_version = obj.metadata.resource_version
+            self.last_sync = time.time()
+            self.condition.notify_all()
+
+    def update(self, obj):
+        # write through the answer of a mutation, unless the watch already delivered something newer
+        with self.condition:
+            cached = self.objects.get(obj.metadata.name)
+            if cached is None or int(obj.metadata.resource_version) > int(cached.metadata.resource_version):
+                self.objects[obj.metadata.name] = obj
+                self.condition.notify_all()
+
+    def get(self, name):
+        with self.condition:
+            return self.objects.get(name)
+
+    def list(self):
+        with self.condition:
+            return list(self.objects.values())
+
+    def wait_for(self, name, predicate, timeout):
+        deadline = time.time() + timeout
+        with self.condition:
+            while True:
+                obj = self.objects.get(name)
+                if obj is not None and predicate(obj):
+                    return True
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                self.condition.wait(remaining)
+
+    def wait_any(self, names, predicate, timeout):
+        """Names of the objects that satisfy predicate, waiting until there is at least one."""
+        deadline = time.time() + timeout
+        with self.condition:
+            while True:
+                ready = {name for name in names if name in self.objects and predicate(self.objects[name])}
+                if ready:
+                    return ready
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return set()
+                self.condition.wait(remaining)
+
+    def staleness(self):
+        """Seconds since the cache last heard from the apiserver, 0 while the watch is open."""
+        if self.last_sync is None:
+            return None
+        return 0 if self.watching else time.time() - self.last_sync
+
+    def is_fresh(self):
+        staleness = self.staleness()
+        return self.synced.is_set() and staleness is not None and staleness <= CACHE_MAX_STALENESS
+
+    def status(self):
+        return {
+            "kind": self.kind,
+            "objects": len(self.objects),
+            "resource_version": self.resource_version,
+            "watching": self.watching,
+            "staleness": self.staleness()
+        }
+
+
+_caches = {}
+
+
+def start_cache(namespace):
+    """Start the pod and StatefulSet caches of namespace, reads fall back to the apiserver when they are stale."""
+    # the watches run on a client of their own, stream() patches the shared one while it execs
+    core_v1 = client.CoreV1Api(new_api_client())
+    app_v1 = client.AppsV1Api(new_api_client())
+    caches = [
+        ResourceCache("pods", core_v1.list_namespaced_pod, namespace, label_selector="app=gauss"),
+        ResourceCache("statefulsets", app_v1.list_namespaced_stateful_set, namespace)
+    ]
+    for cache in caches:
+        if (cache.kind, namespace) in _caches:
+            continue
+        if cache.start() != SUCCESS:
+            return FAILED
+        _caches[(cache.kind, namespace)] = cache
+    return SUCCESS
+
+
+def get_cache(kind, namespace):
+    cache = _caches.get((kind, namespace))
+    if cache is None:
+        return None
+    if not cache.is_fresh():
+        logger.warning("[WARNING]cache of %s is stale: %s" % (kind, cache.status()))
+        return None
+    return cache
+
+
+def cache_status():
+    return [cache.status() for cache in _caches.values()]
+
+
+def format_cache(status):
+    staleness = status["staleness"]
+    return "cache of %s: %s objects at resourceVersion %s, %s, staleness %s" % (
+        status["kind"], status["objects"], status["resource_version"],
+        "watching" if status["watching"] else "not watching",
+        "-" if staleness is None else "%.1fs" % staleness)
+
+
+def split_sql_batches(statements):
+    """Group consecutive statements that can share one round trip.
+
+    Statements matching NON_TRANSACTIONAL_SQL are refused inside a
+    transaction block and get a batch of their own.
+    """
+    batches = []
+    batch = []
+    for sql in statements:
+        sql = sql.strip().rstrip(";").strip()
+        if NON_TRANSACTIONAL_SQL.match(sql):
+            if batch:
+                batches.append(batch)
+                batch = []
+            batches.append([sql])
+        else:
+            batch.append(sql)
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+class GaussPool:
+    """Blocking pool of autocommit connections to one database instance."""
+
+    def __init__(self, size, **conn_kwargs):
+        self.conn_kwargs = conn_kwargs
+        self.idle = []
+        self.lock = threading.Lock()
+        self.size = size
+        self.slots = threading.Semaphore(size)
+
+    def grow(self, size):
+        """Allow up to size connections, a pool never shrinks while connections may be out."""
+        with self.lock:
+            added = size - self.size
+            if added <= 0:
+                return
+            self.size = size
+        self.slots.release(added)
+
+    def acquire(self, timeout=GAUSS_POOL_TIMEOUT):
+        if not self.slots.acquire(timeout=timeout):
+            raise RuntimeError("no idle connection in %ss" % timeout)
+        while True:
+            with self.lock:
+                if not self.idle:
+                    break
+                conn, last_used = self.idle.pop()
+            if self.is_healthy(conn, last_used):
+                return conn
+            self.discard(conn)
+        try:
+            conn = psycopg2.connect(**self.conn_kwargs)
+            conn.set_isolation_level(psycopg2_extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+            return conn
+        except Exception:
+            self.slots.release()
+            raise
+
+    def release(self, conn):
+        if conn.closed:
+            self.discard(conn)
+        else:
+            with self.lock:
+                self.idle.append((conn, time.time()))
+        self.slots.release()
+
+    @staticmethod
+    def is_healthy(conn, last_used):
+        if conn.closed:
+            return False
+        if time.time() - last_used < GAUSS_HEALTH_CHECK_IDLE:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            return True
+        except Exception:
+            logger.warning("[WARNING]drop a broken gauss connection")
+            return False
+
+    @staticmethod
+    def discard(conn):
+        try:
+            conn.close()
+        except Exception:
+            logger.error("Close gauss connect failed")
+
+    def close(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for conn, _ in idle:
+            self.discard(conn)
+
+
+_gauss_pools = {}
+_gauss_pools_lock = threading.Lock()
 
 
 class GaussHelper:
-    def __init__(self, password, port):
+    def __init__(self, password, port, pool_size=GAUSS_POOL_SIZE):
         self.password = password
         self.port = port
-        self.conn = None
-
-    def exec_sql(self, sql, fetch=False):
+        self.pool_size = pool_size
+
+    def get_pool(self):
+        # pools are kept per instance and user for the life of the process, so later commands reuse them,
+        # a command that asks for more connections than the pool has grows it
+        key = (USER, str(self.port), self.password)
+        with _gauss_pools_lock:
+            pool = _gauss_pools.get(key)
+            if pool is None:
+                pool = GaussPool(self.pool_size, dbname="postgres", user=USER, password=self.password,
+                                 host="127.0.0.1", port=self.port)
+                _gauss_pools[key] = pool
+        pool.grow(self.pool_size)
+        return pool
+
+    def exec_sql(self, sql, fetch=False, log_error=True):
         result = None
-        self.get_connection()
-        if not self.conn:
+        conn = self.get_connection()
+        if not conn:
             logger.error("[ERROR]Incorrect password")
             return False, ""
-        self.conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
         try:
-            with self.conn.cursor() as cur:
+            with conn.cursor() as cur:
                 cur.execute(sql)
                 if fetch:
                     result = cur.fetchall()
         except Exception as e:
-            logger.error("exec sql(%s) failed: %s" % (sql, e))
+            if log_error:
+                logger.error("exec sql(%s) failed: %s" % (sql, e))
             return False, result
         finally:
-            self.close(cur)
+            self.close(conn)
         return True, result
 
+    def exec_batch(self, statements):
+        """Execute statements in order with as few round trips as openGauss allows.
+
+        Returns (True, None), or (False, statement) for the statement that failed.
+        """
+        for batch in split_sql_batches(statements):
+            if len(batch) == 1:
+                ret, _ = self.exec_sql(batch[0])
+                if not ret:
+                    return False, batch[0]
+                continue
+            # a multi-statement query runs as one implicit transaction, on failure
+            # nothing of it is left, so replay it one by one to find the culprit
+            ret, _ = self.exec_sql(";\n".join(batch), log_error=False)
+            if ret:
+                continue
+            for sql in batch:
+                ret, _ = self.exec_sql(sql)
+                if not ret:
+                    return False, sql
+        return True, None
+
     def get_connection(self):
         try:
-            self.conn = connect(dbname="postgres", user=USER, password=self.password, host="127.0.0.1", port=self.port)
+            return self.get_pool().acquire()
         except Exception as e:
-            logger.error("[ERROR]Failed to initialize the connection")
+            logger.error("[ERROR]Failed to initialize the connection: %s" % e)
+            return None
+
+    def close(self, conn):
+        # give the connection back to the pool, it is closed only when broken
+        self.get_pool().release(conn)
+
+    @staticmethod
+    def close_all():
+        with _gauss_pools_lock:
+            pools = list(_gauss_pools.values())
+            _gauss_pools.clear()
+        for pool in pools:
+            pool.close()
+
+
+COMMAND_SERVICE = {
+    "create-db-instance": CreateDBInstance,
+    "delete-db-instance": DeleteDBInstance,
+    "add-database": AddDatabase,
+    "remove-database": RemoveDatabase,
+    "start-db-instance": StartDBInstance,
+    "stop-db-instance": StopDBInstance,
+    "status": StatusDBInstance
+}
+
+# context of the daemon request served by the current thread: output and log buffers
+_request_local = threading.local()
+
+
+def bind_request(func):
+    """Wrap func so that it runs with the request context of the calling thread."""
+    context = dict(_request_local.__dict__)
+
+    def wrapper(*args, **kwargs):
+        _request_local.__dict__.update(context)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _request_local.__dict__.clear()
+    return wrapper
+
 
-    def close(self, cur):
+class RequestLogHandler(logging.Handler):
+    def emit(self, record):
+        log = getattr(_request_local, "log", None)
+        if log is not None:
+            log.append(self.format(record))
+
+
+class CommandHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            # a connect without a request, serve checks so whether the socket is alive
+            return
         try:
-            cur.close()
-        except Exception:
-            logger.error("Close gauss cursor failed")
+            argv = json.loads(line.decode("utf-8")).get("argv", [])
+        except ValueError:
+            logger.error("[ERROR]bad request on %s" % DAEMON_SOCKET)
+            return
+        _request_local.output = io.StringIO()
+        _request_local.log = []
         try:
-            self.conn.close()
-        except Exception:
-            logger.error("Close gauss connect failed")
+            if argv and argv[0] == "serve":
+                logger.error("[ERROR]the command is invalid: %s" % argv[0])
+                status = FAILED
+            else:
+                status = run_command(argv)
+        except BaseException as e:
+            # helpers exit(1) on unknown api errors, that must not take the daemon down
+            logger.exception("[ERROR]command %s aborted: %s" % (argv, e))
+            status = FAILED
+        response = {"status": status, "output": _request_local.output.getvalue(), "log": _request_local.log}
+        _request_local.__dict__.clear()
+        self.wfile.write((json.dumps(response) + "\n").encode("utf-8"))
 
 
-def main():
-    logger.info("opengauss_ctl Go")
-    result, status = exec_cmd("whoami")
-    global USER
-    USER = result[0]
-    if USER == "root":
-        logger.error("[ERROR]can not install openGauss with root")
+class CommandServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(args_map):
+    socket_path = args_map.get("socket") or get_socket_path() or DAEMON_SOCKET
+    # warm everything a command needs once: kube clients, watched caches, the request log handler
+    get_kube_clients()
+    if start_cache(NAMESPACE) != SUCCESS:
         return FAILED
-    command_service = {
-        "create-db-instance": CreateDBInstance,
-        "delete-db-instance": DeleteDBInstance,
-        "add-database": AddDatabase,
-        "remove-database": RemoveDatabase,
-        "start-db-instance": StartDBInstance,
-        "stop-db-instance": StopDBInstance
-    }
-    if len(sys.argv) == 1:
+    enable_shell_sessions()
+    log_handler = RequestLogHandler()
+    log_handler.setFormatter(logging.Formatter(LOG_FORMAT, DATE_FORMAT))
+    logging.getLogger().addHandler(log_handler)
+    if os.path.lexists(socket_path):
+        # /tmp is everybody's, only a stale socket of our own is cleared away
+        if os.lstat(socket_path).st_uid != os.geteuid():
+            logger.error("[ERROR]%s belongs to another user, can't serve on it" % socket_path)
+            return FAILED
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            if sock.connect_ex(socket_path) == 0:
+                logger.error("[ERROR]another god_ctl already serves on %s" % socket_path)
+                return FAILED
+        os.remove(socket_path)
+    old_umask = os.umask(0o077)
+    try:
+        server = CommandServer(socket_path, CommandHandler)
+    finally:
+        os.umask(old_umask)
+    logger.info("[INFO]god_ctl serving on %s" % socket_path)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("[INFO]god_ctl stopped")
+    finally:
+        server.server_close()
+        os.remove(socket_path)
+        GaussHelper.close_all()
+    return SUCCESS
+
+
+def get_socket_path():
+    socket_path = os.environ.get("GOD_CTL_SOCKET", DAEMON_SOCKET)
+    if socket_path == "off":
+        return None
+    return socket_path
+
+
+def peer_uid(sock):
+    """uid of the process on the other end of a connected unix socket."""
+    credentials = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+    return struct.unpack("3i", credentials)[1]
+
+
+def absolute_paths(argv):
+    """argv with the values of the FILE_OPTIONS made absolute, the daemon runs in a directory of its own."""
+    argv = list(argv)
+    for index in range(len(argv) - 1):
+        if argv[index].startswith('-') and argv[index].replace("-", "") in FILE_OPTIONS and \
+                not argv[index + 1].startswith('-'):
+            argv[index + 1] = os.path.abspath(argv[index + 1])
+    return argv
+
+
+def forward_command(socket_path, argv):
+    """Run argv on the daemon, returns its status or None when no daemon of ours is listening.
+
+    Once the request is sent the command belongs to the daemon, a lost
+    answer is FAILED and never a reason to run it here a second time.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(socket_path)
+        except OSError:
+            return None
+        # anybody can bind a path in /tmp first, argv and the answer are only for a daemon of our own
+        uid = peer_uid(sock)
+        if uid != os.geteuid():
+            logger.error("[ERROR]%s is served by uid %s, not by us, running the command locally" % (socket_path, uid))
+            return None
+        try:
+            sock.sendall((json.dumps({"argv": absolute_paths(argv)}) + "\n").encode("utf-8"))
+            with sock.makefile("rb") as reader:
+                data = reader.readline()
+        except OSError as e:
+            data = None
+            logger.error("[ERROR]connection to the daemon on %s failed: %s" % (socket_path, e))
+    if not data:
+        logger.error("[ERROR]no answer from the daemon on %s, the command may or may not have run" % socket_path)
+        return FAILED
+    response = json.loads(data.decode("utf-8"))
+    for line in response["log"]:
+        sys.stderr.write(line + "\n")
+    if response["output"]:
+        print_screen(response["output"], append_new_line=False)
+    return response["status"]
+
+
+def run_command(argv):
+    if not argv:
         print_screen(usage_info)
         return FAILED
-    command = sys.argv[COMMAND_INDEX]
-    args = sys.argv[ARG_START_INDEX:]
-    args_map = _get_args_map(args)
-    service = command_service.get(command)
+    command = argv[0]
+    args_map = _get_args_map(argv[1:])
+    if command == "serve":
+        return serve(args_map)
+    service = COMMAND_SERVICE.get(command)
     if not service:
         logger.error("[ERROR]the command is invalid: %s" % command)
         print_screen(usage_info)
         return FAILED
-    return service().exec(args_map) == SUCCESS
+    service_instance = service()
+    if "cache" in args_map or os.environ.get("GOD_CTL_CACHE") == "1":
+        start_cache(NAMESPACE)
+    if "session" in args_map or os.environ.get("GOD_CTL_SESSION") == "1":
+        enable_shell_sessions()
+    return service_instance.exec(args_map)
+
+
+def main():
+    argv = sys.argv[COMMAND_INDEX:]
+    socket_path = get_socket_path()
+    if argv and argv[0] != "serve" and socket_path and os.path.exists(socket_path):
+        status = forward_command(socket_path, argv)
+        if status is not None:
+            return status == SUCCESS
+    logger.info("opengauss_ctl Go")
+    global USER
+    USER = pwd.getpwuid(os.geteuid()).pw_name
+    if USER == "root":
+        logger.error("[ERROR]can not install openGauss with root")
+        return FAILED
+    return run_command(argv) == SUCCESS
 
 
 if __name__ == '__main__':
     main()
-
@@ -1,56 +1,102 @@
 #!/bin/bash
+# PID 1 until supervisor.py takes over, without a trap SIGTERM is ignored until the SIGKILL
+trap 'exit 143' TERM
 instance_dir=$GAUSS_ROOT/data/$INSTANCE_ID
-time_out=0
+gs_ctl=$GAUSS_ROOT/app/bin/gs_ctl
+# god_ctl writes the marker once the member is initialized and configured (or at start-db-instance)
+# and wakes us up through the fifo, stop-db-instance removes it again
+ready_file=$GAUSS_ROOT/data/.ready-$INSTANCE_ID
+ready_fifo=$ready_file.fifo
+handshake_timeout=${HANDSHAKE_TIMEOUT:-600}
+# health files of the kubernetes probes
+run_dir=$GAUSS_ROOT/run
+# exists while we build or start the member, god_ctl doesn't start it by exec meanwhile; supervisor.py removes it
+starting_file=$run_dir/starting
+
+# a member that was signalled before (pod restart) goes at once, otherwise wait for god_ctl
+wait_for_ready()
+{
+	if [ ! -f $ready_file ]
+	then
+		rm -f $ready_fifo
+		mkfifo $ready_fifo
+		# opened read-write the fifo never blocks god_ctl, read returns on its first write
+		[ -f $ready_file ] || read -t $handshake_timeout signal <> $ready_fifo
+		rm -f $ready_fifo
+	fi
+	[ -f $ready_file ] || echo "no signal from god_ctl in ${handshake_timeout}s, starting anyway"
+}
+
+# wait until the standby replicates: 0 for Normal or Catchup, 1 for Need repair or no answer
+standby_streaming()
+{
+	for i in $(seq 15)
+	do
+		state=`$gs_ctl query -D $instance_dir 2>/dev/null | awk -F': ' '/db_state/{print $2; exit}'`
+		case "$state" in
+			Normal|Catchup) return 0;;
+			"Need repair") return 1;;
+		esac
+		sleep 2
+	done
+	return 1
+}
+
+# start an existing standby and stream the missed WAL, else incremental build, full build as the last resort
+catch_up_standby()
+{
+	if $gs_ctl start -D $instance_dir -M standby && standby_streaming
+	then
+		echo "standby $INSTANCE_ID started, catching up by streaming"
+		return 0
+	fi
+	$gs_ctl stop -D $instance_dir -m fast
+	if $gs_ctl build -D $instance_dir -b incremental && standby_streaming
+	then
+		echo "standby $INSTANCE_ID caught up by an incremental build"
+		return 0
+	fi
+	echo "standby $INSTANCE_ID can't catch up incrementally, full build"
+	$gs_ctl stop -D $instance_dir -m fast
+	full_build
+}
+
+# a fresh standby has nothing in common with the primary, later restarts catch up incrementally
+full_build()
+{
+	$gs_ctl build -D $instance_dir -b full && echo start > $ready_file
+}
 
 
 
 echo $instance_dir
-while [ $time_out -le 12 -a ! -d $instance_dir ]
-do
-        echo "waiting for init_db"
-        let time_out+=1
-        sleep 5
-done
-sleep 60
+# ready while waiting for god_ctl, then again once supervisor.py sees the database running
+mkdir -p $run_dir && touch $run_dir/alive $run_dir/ready
+wait_for_ready
+rm -f $run_dir/ready
+action=`cat $ready_file 2>/dev/null`
+echo ${action:-start} > $starting_file
 
 
+start_options=""
 if [ X$SINGLE == X"true" ]
 then
-	start_cmd="$GAUSS_ROOT/app/bin/gs_ctl start -D $instance_dir -Z single_mode"
+	start_options="-Z single_node"
 elif [[ $INSTANCE_ID =~ "-0" ]]
 then
-	start_cmd="$GAUSS_ROOT/app/bin/gs_ctl start -D $instance_dir -M primary"
-elif [[ X"`ps aux | grep gaussdb | grep -v grep`"==X"" ]]
+	start_options="-M primary"
+elif [ X"$action" == X"build" ]
+then
+	echo "full_build"
+	full_build
+elif [[ X"`ps aux | grep gaussdb | grep -v grep`" == X"" ]]
 then
-	start_cmd="$GAUSS_ROOT/app/bin/gs_ctl build -D $instance_dir -b full"
+	echo "catch_up_standby"
+	# the server is down for a while between the attempts, supervisor.py only takes over afterwards
+	catch_up_standby
 else
-	start_cmd="echo 'gaussdb instance exists, there is nothing to do.'"
+	echo "gaussdb instance exists, there is nothing to do."
 fi
-echo "$start_cmd"
-nohup $start_cmd &
-
-
-let time_out=0
-while  [ $time_out -le 10 ]
-do
-        process=`ps aux | grep gaussdb | grep -v grep`
-        if [ "$process" != "" ]
-        then
-                echo "instance start";
-                break
-        fi
-        echo "instance $INSTANCE_ID is starting"
-        sleep 3
-done
-while true
-do
-        process=`ps aux | grep gaussdb | grep -v grep`
-        if [ "$process" == "" ]
-        then
-                echo "instance down";
-                exit 1
-        fi
-        echo "instance $INSTANCE_ID is running"
-        sleep 3
-done
-exit 0
+
+# starts the database if start_options are given and lives as long as its postmaster
+exec python3 $GAUSS_ROOT/supervisor.py -D $instance_dir $start_options
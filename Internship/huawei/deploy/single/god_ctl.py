@@ -29,6 +29,7 @@ GS_CTl_PATH = GAUSS_HOME + "/bin/gs_ctl"
 GS_INITDB_PATH = GAUSS_HOME + "/bin/gs_initdb"
 GS_DATA_PATH = GAUSS_ROOT + "/data"
 KUBE_CONFIG_PATH = "config"
+HANDSHAKE_TIMEOUT = 60  # 通知pod启动数据库后等待其运行的时间(秒), 超时后改为exec启动
 
 LOG_FORMAT = "%(asctime)s - %(levelname)s - [%(module)s - %(lineno)d : %(funcName)s] - %(message)s"
 DATE_FORMAT = "%m/%d/%Y %H:%M:%S %p"
@@ -280,6 +281,9 @@ class CreateDBInstance(Instance):
             return FAILED
 
         logger.info("[INFO]start instance")
+        if signal_ready(self.core_v1, instance_id, instance) and wait_started(self.core_v1, instance_id, instance):
+            logger.info("[INFO]create instance(%s) success" % instance)
+            return SUCCESS
         startdb_cmd = "%s start -D %s -Z single_node" % (self.gs_ctl_path, self.instance_dir)
         logger.info(startdb_cmd)
         result, status = exec_remote_cmd(startdb_cmd, self.core_v1, instance_id, NAMESPACE)
@@ -610,6 +614,9 @@ class StartDBInstance(Instance):
             logger.error("[INFO]instance(%s) is running" % instance)
             return FAILED
 
+        if signal_ready(self.core_v1, instance_id, instance) and wait_started(self.core_v1, instance_id, instance):
+            logger.info("[INFO]start instance(%s) success" % instance)
+            return SUCCESS
         startdb_cmd = "%s start -D %s -Z single_node" % (self.gs_ctl_path, self.instance_dir)
         logger.info(startdb_cmd)
         result, status = exec_remote_cmd(startdb_cmd, self.core_v1, instance_id, NAMESPACE)
@@ -674,6 +681,8 @@ class StopDBInstance(Instance):
             logger.info("[INFO]instance(%s) is not running" % instance)
             return FAILED
 
+        # the next pod of the instance waits for god_ctl instead of starting the database at once
+        exec_remote_cmd("rm -f %s/.ready-%s" % (GS_DATA_PATH, instance), self.core_v1, instance_id, NAMESPACE)
         stopdb_cmd = "%s stop -D %s" % (self.gs_ctl_path, self.instance_dir)
         logger.info(stopdb_cmd)
         result, status = exec_remote_cmd(stopdb_cmd, self.core_v1, instance_id, NAMESPACE)
@@ -747,6 +756,28 @@ def exec_remote_cmd(command, api_instance, name, namespace):
     return result, resp.returncode
 
 
+def signal_ready(api_instance, instance_id, instance):
+    """Write the ready marker of the instance and wake up its init.sh, True if the pod was waiting for it."""
+    ready_file = "%s/.ready-%s" % (GS_DATA_PATH, instance)
+    signal_cmd = ("echo start > {0} && if [ -p {0}.fifo ]; then "
+                  "timeout 5 bash -c 'echo start > {0}.fifo' && echo signalled; fi").format(ready_file)
+    result, status = exec_remote_cmd(signal_cmd, api_instance, instance_id, NAMESPACE)
+    return status == 0 and re.search("signalled", "".join(result)) is not None
+
+
+def wait_started(api_instance, instance_id, instance, timeout=HANDSHAKE_TIMEOUT):
+    time_out = 0
+    while time_out < timeout:
+        result, status = exec_remote_cmd("ps -efww | grep -w %s | grep 'gaussdb ' | grep -v grep" % instance
+                                         , api_instance, instance_id, NAMESPACE)
+        if result:
+            return True
+        time.sleep(1)
+        time_out += 1
+    logger.warning("[WARNING]instance(%s) not running %ss after the signal, start by exec" % (instance, timeout))
+    return False
+
+
 def exec_cmd(command):
     logger.info("the command to be executed is %s" % command)
     with subprocess.Popen(command, shell=True, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
@@ -897,14 +928,16 @@ def gen_template(instance):
                 },
                 'spec': {
                     'hostNetwork': True,
-                    'terminationGracePeriodSeconds': 10,
+                    # time for supervisor.py's gs_ctl stop -m fast on SIGTERM, init.sh is exec'd so that it
+                    # replaces the bash of PID 1, which ignores the signal
+                    'terminationGracePeriodSeconds': 60,
                     'nodeSelector': {
                         'cloudsop/agent-type': 'Base'
                     },
                     'containers': [
                         {
                             'command': ['/bin/bash', '-c'],
-                            'args': ['source ~/.bashrc && bash ./data/init.sh.single'],
+                            'args': ['source ~/.bashrc && exec bash ./data/init.sh.single'],
                             'env': [
                                 {
                                     'name': 'GAUSS_ROOT',
@@ -918,6 +951,16 @@ def gen_template(instance):
                             'name': instance,
                             'image': 'qqq:latest',
                             'imagePullPolicy': 'Never',
+                            # health files written by init.sh and supervisor.py of the image
+                            'readinessProbe': {
+                                'exec': {'command': ['test', '-f', GAUSS_ROOT + '/run/ready']},
+                                'periodSeconds': 2
+                            },
+                            'livenessProbe': {
+                                'exec': {'command': ['test', '-f', GAUSS_ROOT + '/run/alive']},
+                                'initialDelaySeconds': 10,
+                                'periodSeconds': 5
+                            },
                             'ports': [{'containerPort': 80, 'name': 'default'}],
                             'volumeMounts': [
                                 {
@@ -1,37 +1,27 @@
 #!/bin/bash
+# PID 1 until supervisor.py takes over, without a trap SIGTERM is ignored until the SIGKILL
+trap 'exit 143' TERM
 instance_dir=$GAUSS_ROOT/data/$INSTANCE
-time_out=0
 mode=single_node
+# god_ctl writes the marker once the instance is initialized and configured (or at start-db-instance)
+# and wakes us up through the fifo, stop-db-instance removes it again
+ready_file=$GAUSS_ROOT/data/.ready-$INSTANCE
+ready_fifo=$ready_file.fifo
+handshake_timeout=${HANDSHAKE_TIMEOUT:-600}
 echo $instance_dir
-while [ $time_out -le 12 -a ! -d $instance_dir ]
-do
-        echo "waiting for init_db"
-        let time_out+=1
-        sleep 5
-done
-sleep 30
-nohup $GAUSS_ROOT/app/bin/gs_ctl start -D $instance_dir -Z $mode  &
-let time_out=0
-while  [ $time_out -le 10 ]
-do
-        process=`ps aux | grep gaussdb | grep -v grep`
-        if [ "$process" != "" ]
-        then
-                echo "instance start";
-                break
-        fi
-        echo "instance $INSTANCE is starting"
-        sleep 3
-done
-while true
-do
-        process=`ps aux | grep gaussdb | grep -v grep`
-        if [ "$process" == "" ]
-        then
-                echo "instance down";
-                exit 1
-        fi
-        echo "instance $INSTANCE is running"
-        sleep 3
-done
-exit 0
+# health files of the kubernetes probes, ready while waiting for god_ctl and once the database runs
+run_dir=$GAUSS_ROOT/run
+mkdir -p $run_dir && touch $run_dir/alive $run_dir/ready
+# an instance that was signalled before (pod restart) goes at once, otherwise wait for god_ctl
+if [ ! -f $ready_file ]
+then
+        rm -f $ready_fifo
+        mkfifo $ready_fifo
+        # opened read-write the fifo never blocks god_ctl, read returns on its first write
+        [ -f $ready_file ] || read -t $handshake_timeout signal <> $ready_fifo
+        rm -f $ready_fifo
+fi
+[ -f $ready_file ] || echo "no signal from god_ctl in ${handshake_timeout}s, starting anyway"
+rm -f $run_dir/ready
+# starts the database and lives as long as its postmaster
+exec python3 $GAUSS_ROOT/supervisor.py -D $instance_dir -Z $mode
@@ -0,0 +1,153 @@
+import os
+import sys
+import time
+import ctypes
+import select
+import signal
+import logging
+import subprocess
+
+# Keeps the container of a gaussdb member alive exactly as long as its postmaster.
+# It starts the database with gs_ctl when start options are given, then waits on
+# the postmaster pid and reports health through files under $GAUSS_ROOT/run that
+# the kubernetes probes of god_ctl's gen_template test:
+#   ready  the pod waits for god_ctl's start signal (written by init.sh) or the database runs
+#   alive  the container is up, removed once the postmaster is gone
+# The starting file of init.sh goes once the database runs or won't start.
+# Usage: python3 supervisor.py -D <data dir> [gs_ctl start options]
+GAUSS_ROOT = os.environ.get("GAUSS_ROOT", "/opt/data1/greenopengauss")
+GS_CTL_PATH = GAUSS_ROOT + "/app/bin/gs_ctl"
+RUN_PATH = GAUSS_ROOT + "/run"
+READY_FILE = RUN_PATH + "/ready"
+ALIVE_FILE = RUN_PATH + "/alive"
+STARTING_FILE = RUN_PATH + "/starting"
+PID_FILE_TIMEOUT = 60  # 等待postmaster.pid出现的时间(秒)
+POLL_INTERVAL = 1  # 没有pidfd时检查postmaster是否存活的间隔(秒)
+SYS_PIDFD_OPEN = 434  # pidfd_open的系统调用号, python3.8没有os.pidfd_open
+PR_SET_CHILD_SUBREAPER = 36
+
+LOG_FORMAT = "%(asctime)s - %(levelname)s - [%(module)s - %(lineno)d : %(funcName)s] - %(message)s"
+DATE_FORMAT = "%m/%d/%Y %H:%M:%S %p"
+logging.basicConfig(filename=None,
+                    filemode='a',
+                    format=LOG_FORMAT,
+                    datefmt=DATE_FORMAT,
+                    level=logging.INFO)
+logger = logging.getLogger(__name__)
+libc = ctypes.CDLL(None, use_errno=True)
+
+
+def mark(path, present):
+    if present:
+        open(path, "w").close()
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+def reap():
+    # the postmaster is reparented to us once gs_ctl exits, don't leave it a zombie
+    while True:
+        try:
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            return
+        if pid == 0:
+            return
+
+
+def is_alive(pid):
+    reap()
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def read_postmaster_pid(instance_dir, timeout=PID_FILE_TIMEOUT):
+    """Pid of the running postmaster of instance_dir, None if there is none within timeout."""
+    deadline = time.time() + timeout
+    while True:
+        try:
+            with open(os.path.join(instance_dir, "postmaster.pid")) as pid_file:
+                pid = int(pid_file.readline().strip())
+            if is_alive(pid):
+                return pid
+        except (OSError, ValueError):
+            pass
+        if time.time() > deadline:
+            return None
+        time.sleep(POLL_INTERVAL)
+
+
+def pidfd_open(pid):
+    fd = libc.syscall(SYS_PIDFD_OPEN, pid, 0)
+    if fd < 0:
+        logger.info("pidfd_open not available (errno %s), polling the postmaster" % ctypes.get_errno())
+        return None
+    return fd
+
+
+def wait_exit(pid):
+    """Block until the process pid is gone."""
+    fd = pidfd_open(pid)
+    if fd is None:
+        while is_alive(pid):
+            time.sleep(POLL_INTERVAL)
+        return
+    try:
+        poller = select.poll()
+        poller.register(fd, select.POLLIN)
+        # the pidfd becomes readable when the process exits
+        while not poller.poll(POLL_INTERVAL * 1000):
+            reap()
+        reap()
+    finally:
+        os.close(fd)
+
+
+def main(argv):
+    if len(argv) < 2 or argv[0] != "-D":
+        print("Usage: python3 supervisor.py -D <data dir> [gs_ctl start options]")
+        return 1
+    instance_dir, start_options = argv[1], argv[2:]
+    os.makedirs(RUN_PATH, exist_ok=True)
+    libc.prctl(PR_SET_CHILD_SUBREAPER, 1, 0, 0, 0)
+
+    def stop(signum, frame):
+        logger.info("signal %s, stopping instance %s" % (signum, instance_dir))
+        mark(READY_FILE, False)
+        subprocess.run([GS_CTL_PATH, "stop", "-D", instance_dir, "-m", "fast"])
+        mark(ALIVE_FILE, False)
+        sys.exit(0)
+
+    signal.signal(signal.SIGTERM, stop)
+    mark(ALIVE_FILE, True)
+
+    pid = read_postmaster_pid(instance_dir, 0)
+    if pid is None and start_options:
+        start_cmd = [GS_CTL_PATH, "start", "-D", instance_dir] + start_options
+        logger.info(" ".join(start_cmd))
+        subprocess.run(start_cmd)
+    if pid is None:
+        pid = read_postmaster_pid(instance_dir)
+    # init.sh and we are done with the member, god_ctl may start it by exec from now on
+    mark(STARTING_FILE, False)
+    if pid is None:
+        logger.error("no postmaster running in %s" % instance_dir)
+        mark(ALIVE_FILE, False)
+        return 1
+
+    logger.info("instance %s running, postmaster pid %s" % (instance_dir, pid))
+    mark(READY_FILE, True)
+    wait_exit(pid)
+    mark(READY_FILE, False)
+    mark(ALIVE_FILE, False)
+    logger.info("instance down")
+    return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))